@@ -0,0 +1,76 @@
+import os, struct, binascii
+
+class ControllerStateStore:
+    """
+    Checkpoint of the WateringController PID state (integral, last error, last event time), so that a reboot
+    doesn't forget the deadtime and the integral doesn't have to wind up again. The state is a single
+    fixed-layout record with a CRC, restored with one read at boot and written through a temporary file
+    and a rename. Writes are throttled to spare the flash: a new watering event is written right away,
+    other changes at most every minIntervalSec, and only if the integral moved by more than the tolerance
+    given to store() (or the last error changed).
+    """
+    MAGIC = b'PID1'
+    RECORD_FORMAT = '<4sIffI' # magic, saved time, integral, last error, last event time
+    DATA_SIZE = struct.calcsize(RECORD_FORMAT)
+    RECORD_SIZE = DATA_SIZE + 4 # crc32 of the data
+
+    def __init__(self, filePath: str, console, minIntervalSec: int = 30*60):
+        self.filePath = filePath
+        self.console = console
+        self.minIntervalSec = minIntervalSec
+        self.storedState = None
+        self.storedTime = None
+        self.writes = 0
+
+    def load(self):
+        # returns (saved time, (integral, last error, last event time)), or None if there's no valid record
+        try:
+            with open(self.filePath, 'rb') as f:
+                data = f.read()
+        except OSError:
+            self.console.write(f"No controller state stored yet ({self.filePath})")
+            return None
+
+        if (len(data) != ControllerStateStore.RECORD_SIZE) or \
+                (struct.unpack_from('<I', data, ControllerStateStore.DATA_SIZE)[0] != self.__crc(data[:ControllerStateStore.DATA_SIZE])):
+            self.console.write(f"Invalid controller state record, ignored ({self.filePath})")
+            return None
+        magic, savedTime, integral, lastError, lastEventTime = struct.unpack_from(ControllerStateStore.RECORD_FORMAT, data)
+        if magic != ControllerStateStore.MAGIC:
+            self.console.write(f"Unknown controller state format, ignored ({self.filePath})")
+            return None
+        self.storedState = (integral, lastError, lastEventTime)
+        self.storedTime = savedTime
+        return savedTime, self.storedState
+
+    def store(self, t: int, state, integralTolerance=0.0):
+        # returns True if the state was written
+        integral, lastError, lastEventTime = state
+        stored = self.storedState
+        if (stored is not None) and (lastEventTime == stored[2]):
+            if t - self.storedTime < self.minIntervalSec:
+                return False
+            if (abs(integral - stored[0]) <= integralTolerance) and (self.__float32(lastError) == stored[1]):
+                return False
+
+        data = struct.pack(ControllerStateStore.RECORD_FORMAT, ControllerStateStore.MAGIC, t, integral, lastError, lastEventTime)
+        tmpPath = self.filePath + ".tmp"
+        try:
+            with open(tmpPath, 'wb') as f:
+                f.write(data)
+                f.write(struct.pack('<I', self.__crc(data)))
+            os.rename(tmpPath, self.filePath)
+        except Exception as error:
+            self.console.write(f"Error while storing controller state ({self.filePath}): {error}")
+            return False
+        # kept as read back from the record, so the comparisons above match after a reboot as well
+        self.storedState = (self.__float32(integral), self.__float32(lastError), lastEventTime)
+        self.storedTime = t
+        self.writes += 1
+        return True
+
+    def __crc(self, data):
+        return binascii.crc32(data) & 0xFFFFFFFF
+
+    def __float32(self, value):
+        return struct.unpack('<f', struct.pack('<f', value))[0]
@@ -0,0 +1,72 @@
+import os, struct
+
+class EventLogStore:
+    """
+    Append-only binary storage for watering event timestamps, to be used as WateringController
+    load/store event log callbacks. Every event is a fixed-size record, so storing a new event appends
+    a few bytes instead of rewriting the whole history. The file is compacted (rewritten with the events
+    passed to store()) only once it grows past maxFileSize.
+    """
+    RECORD_FORMAT = '<I' # unsigned 32-bit timestamp
+    RECORD_SIZE = 4
+
+    def __init__(self, filePath: str, console, maxFileSize: int = 4096):
+        self.filePath = filePath
+        self.console = console
+        self.maxFileSize = maxFileSize
+        self.fileSize = 0
+        self.lastStoredTime = None
+
+    def load(self):
+        # single bulk read, partial record at the end (e.g. power loss while appending) is dropped
+        try:
+            with open(self.filePath, 'rb') as f:
+                data = f.read()
+        except OSError:
+            self.console.write(f"No event log stored yet ({self.filePath})")
+            return []
+
+        count = len(data) // EventLogStore.RECORD_SIZE
+        events = list(struct.unpack(f"<{count}I", data[:count * EventLogStore.RECORD_SIZE])) if count else []
+        self.fileSize = len(data)
+        self.lastStoredTime = events[-1] if events else None
+        if len(data) != count * EventLogStore.RECORD_SIZE:
+            self.console.write(f"Truncated record in event log, recovering ({self.filePath})")
+            self.__rewrite(events)
+        return events
+
+    def store(self, events):
+        # events is the whole (sorted) event log, only the ones newer than already stored get appended
+        newCount = 0
+        for t in reversed(events):
+            if (self.lastStoredTime is not None) and (t <= self.lastStoredTime):
+                break
+            newCount += 1
+        if newCount == 0:
+            return
+
+        if self.fileSize + newCount * EventLogStore.RECORD_SIZE > self.maxFileSize:
+            self.__rewrite(events)
+            return
+
+        try:
+            with open(self.filePath, 'ab') as f:
+                for t in events[len(events) - newCount:]:
+                    f.write(struct.pack(EventLogStore.RECORD_FORMAT, t))
+            self.fileSize += newCount * EventLogStore.RECORD_SIZE
+            self.lastStoredTime = events[-1]
+        except Exception as error:
+            self.console.write(f"Error while appending event log ({self.filePath}): {error}")
+
+    def __rewrite(self, events):
+        tmpPath = self.filePath + ".tmp"
+        try:
+            with open(tmpPath, 'wb') as f:
+                for t in events:
+                    f.write(struct.pack(EventLogStore.RECORD_FORMAT, t))
+            os.rename(tmpPath, self.filePath)
+            self.fileSize = len(events) * EventLogStore.RECORD_SIZE
+            self.lastStoredTime = events[-1] if events else None
+            self.console.write(f"Compacted event log ({self.filePath}), {len(events)} events")
+        except Exception as error:
+            self.console.write(f"Error while compacting event log ({self.filePath}): {error}")
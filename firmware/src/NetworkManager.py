@@ -0,0 +1,147 @@
+import uasyncio as asyncio
+import random
+from wifi import Wifi
+from config import WifiConfig
+from scheduler import SystemClock
+import status as deviceStatus
+import loopmonitor
+
+class NetworkManager:
+    """
+    Keeps the station connected. The link state is checked every second (just a status read), a drop starts
+    reconnecting right away and failed attempts are retried with jittered exponential backoff. After a few
+    failures the access point is started next to the station interface, so the device stays reachable while
+    the attempts go on; it's stopped again once the station has been connected for a while.
+    Credentials are read from the config on every attempt, so a new ssid/password is used without reboot.
+    """
+    LINK_CHECK_MS = 1000
+    CONNECT_POLL_MS = 200
+    CONNECT_TIMEOUT_MS = 15000
+    BACKOFF_BASE_MS = 2000
+    BACKOFF_MAX_MS = 5*60*1000
+    AP_FALLBACK_ATTEMPTS = 3
+    AP_STOP_GRACE_MS = 60*1000 # keeps the AP up for a while, e.g. for the client that just changed the credentials
+
+    def __init__(self, wifi: Wifi, config: WifiConfig, console, clock=None):
+        self.wifi = wifi
+        self.config = config
+        self.console = console
+        self.clock = clock if clock else SystemClock()
+
+        self.connected = False
+        self.connectedTicks = None
+        self.apStartedTicks = None
+        self.linkDownTicks = None # set on a drop, cleared once reconnected
+        self.failedAttempts = 0 # in a row
+
+        # statistics
+        self.attempts = 0
+        self.disconnects = 0
+        self.apFallbacks = 0
+        self.recoveries = 0
+        self.lastRecoveryMs = None
+        self.maxRecoveryMs = 0
+        self.totalRecoveryMs = 0
+        asyncio.create_task(loopmonitor.track('network', self.runTask()))
+
+    def toDict(self):
+        return {'connected': self.connected, 'attempts': self.attempts, 'failedAttempts': self.failedAttempts,
+                'disconnects': self.disconnects, 'apFallbacks': self.apFallbacks,
+                'lastRecoveryMs': self.lastRecoveryMs, 'maxRecoveryMs': self.maxRecoveryMs,
+                'avgRecoveryMs': (self.totalRecoveryMs // self.recoveries) if self.recoveries else None}
+
+    async def runTask(self):
+        while True:
+            try:
+                if self.wifi.IsConnected():
+                    self.__onLinkUp()
+                    await asyncio.sleep_ms(NetworkManager.LINK_CHECK_MS)
+                    continue
+                self.__onLinkDown()
+                if await self.__tryConnect():
+                    continue
+                self.failedAttempts += 1
+                self.__updateStatus()
+                if (self.failedAttempts >= NetworkManager.AP_FALLBACK_ATTEMPTS) and (not self.wifi.ApIsReady()):
+                    self.apFallbacks += 1
+                    await self.__startAp()
+                await asyncio.sleep_ms(self.__backoffMs())
+            except Exception as e:
+                self.console.write(f"Error while network handling: {str(e)}")
+                await asyncio.sleep_ms(NetworkManager.BACKOFF_BASE_MS)
+
+    async def __tryConnect(self):
+        ssid = self.config.values['ssid']
+        password = self.config.values['password']
+        if (not ssid) or (not password):
+            return False
+        self.attempts += 1
+        self.console.write(f'Connecting to WiFi ({ssid})...')
+        self.wifi.BeginConnect(ssid, password)
+        start = self.clock.ticks_ms()
+        while self.clock.ticks_diff(self.clock.ticks_ms(), start) < NetworkManager.CONNECT_TIMEOUT_MS:
+            await asyncio.sleep_ms(NetworkManager.CONNECT_POLL_MS)
+            if self.wifi.IsConnected():
+                return True
+            status = self.wifi.Status()
+            if status < 0:
+                self.console.write(f'Connection failed (status {status}).')
+                return False
+        self.console.write('Connection timeout.')
+        return False
+
+    def __backoffMs(self):
+        # "equal jitter": half of the delay is fixed, the other half random, so retries of many devices spread out
+        delay = min(NetworkManager.BACKOFF_MAX_MS,
+                    NetworkManager.BACKOFF_BASE_MS << min(self.failedAttempts - 1, 16))
+        return delay // 2 + random.randint(0, delay // 2)
+
+    async def __startAp(self):
+        ssid = self.config.values['ap_ssid']
+        self.console.write(f"Starting access point with SSID={ssid}")
+        # set first, the link check must not take the AP for an expired one while it's starting
+        self.apStartedTicks = self.clock.ticks_ms()
+        await self.wifi.ApStart(ssid, self.config.values['ap_password'], keepSta=True)
+        self.__updateStatus()
+
+    def requestAccessPoint(self):
+        # starts the AP on demand (e.g. to change the credentials), it's stopped after the grace time like a fallback one
+        if not self.wifi.ApIsReady():
+            asyncio.create_task(self.__startAp())
+
+    def __onLinkUp(self):
+        now = self.clock.ticks_ms()
+        if not self.connected:
+            self.connected = True
+            self.connectedTicks = now
+            self.failedAttempts = 0
+            if self.linkDownTicks is not None:
+                recoveryMs = self.clock.ticks_diff(now, self.linkDownTicks)
+                self.linkDownTicks = None
+                self.recoveries += 1
+                self.lastRecoveryMs = recoveryMs
+                self.maxRecoveryMs = max(self.maxRecoveryMs, recoveryMs)
+                self.totalRecoveryMs += recoveryMs
+                self.console.write(f"WiFi recovered after {recoveryMs} ms")
+            self.console.write(f'Connected. IP: {self.wifi.GetIp()}')
+            self.__updateStatus()
+        elif self.wifi.ApIsReady() and \
+                (self.clock.ticks_diff(now, self.connectedTicks) >= NetworkManager.AP_STOP_GRACE_MS) and \
+                ((self.apStartedTicks is None) or
+                 (self.clock.ticks_diff(now, self.apStartedTicks) >= NetworkManager.AP_STOP_GRACE_MS)):
+            self.console.write("Stopping access point")
+            self.wifi.ApStop()
+            self.__updateStatus()
+
+    def __onLinkDown(self):
+        if self.connected:
+            self.connected = False
+            self.disconnects += 1
+            self.linkDownTicks = self.clock.ticks_ms()
+            self.console.write("WiFi link lost")
+            self.__updateStatus()
+
+    def __updateStatus(self):
+        deviceStatus.updateFields({'wifiIp': self.wifi.GetIp() if self.wifi.IsConnected() else None,
+                                   'apIp': self.wifi.ApGetIp() if self.wifi.ApIsReady() else None,
+                                   'wifi': self.toDict()})
@@ -0,0 +1,113 @@
+from array import array
+
+class ControllerTelemetry:
+    """
+    RAM ring buffer with one sample per controller evaluation: timestamp, average, p, i, d (control is their sum)
+    and whether it triggered watering. Values are stored as centiliters in int16 columns, 13 bytes per sample,
+    so 3 days of minute samples take ~55 kB.
+    """
+    SCALE = 100 # centiliters
+    VALUE_MAX = 32767
+    COLUMNS = ("average", "control", "p", "i", "d")
+    MAX_POINTS = 1000
+    BUCKETS_PER_CHUNK = 8
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.times = array('L', [0] * capacity)
+        self.average = array('h', [0] * capacity)
+        self.p = array('h', [0] * capacity)
+        self.i = array('h', [0] * capacity)
+        self.d = array('h', [0] * capacity)
+        self.watered = bytearray(capacity)
+        self.head = 0
+        self.count = 0
+
+    def record(self, t: int, average, pid_values, watered: bool):
+        index = (self.head + self.count) % self.capacity
+        if self.count == self.capacity:
+            self.head = (self.head + 1) % self.capacity
+        else:
+            self.count += 1
+        p, i, d = pid_values
+        self.times[index] = t
+        self.average[index] = self.__toFixed(average)
+        self.p[index] = self.__toFixed(p)
+        self.i[index] = self.__toFixed(i)
+        self.d[index] = self.__toFixed(d)
+        self.watered[index] = 1 if watered else 0
+
+    def timeRange(self):
+        if not self.count:
+            return None, None
+        return self.times[self.head], self.times[(self.head + self.count - 1) % self.capacity]
+
+    def iterJson(self, start=None, end=None, points=200):
+        """
+        Generator of JSON text chunks with samples within [start, end] downsampled to at most `points` buckets.
+        Every bucket is [first time, last time, waterings, then min, mean, max for each of COLUMNS], in liters.
+        """
+        first = self.__firstIndexAtOrAfter(start) if start is not None else 0
+        last = self.__firstIndexAtOrAfter(end + 1) if end is not None else self.count
+        points = max(1, min(points, ControllerTelemetry.MAX_POINTS))
+        samples = max(0, last - first)
+        bucketSize = max(1, -(-samples // points))
+
+        yield '{"columns": ["t_first", "t_last", "waterings"'
+        for name in ControllerTelemetry.COLUMNS:
+            yield f', "{name}_min", "{name}_mean", "{name}_max"'
+        yield f'], "samples": {samples}, "bucket_size": {bucketSize}, "buckets": ['
+
+        chunk = []
+        for bucketStart in range(first, last, bucketSize):
+            chunk.append(self.__bucketJson(bucketStart, min(bucketStart + bucketSize, last), bucketStart == first))
+            if len(chunk) == ControllerTelemetry.BUCKETS_PER_CHUNK:
+                yield ''.join(chunk)
+                chunk = []
+        chunk.append(']}')
+        yield ''.join(chunk)
+
+    def __bucketJson(self, begin, end, isFirst):
+        # begin, end are logical indexes (0 = oldest sample)
+        mins = [None] * 5
+        maxs = [None] * 5
+        sums = [0] * 5
+        waterings = 0
+        for logical in range(begin, end):
+            index = (self.head + logical) % self.capacity
+            p, i, d = self.p[index], self.i[index], self.d[index]
+            values = (self.average[index], p + i + d, p, i, d)
+            for column in range(5):
+                value = values[column]
+                if (mins[column] is None) or (value < mins[column]):
+                    mins[column] = value
+                if (maxs[column] is None) or (value > maxs[column]):
+                    maxs[column] = value
+                sums[column] += value
+            waterings += self.watered[index]
+
+        count = end - begin
+        scale = ControllerTelemetry.SCALE
+        fields = [str(self.times[(self.head + begin) % self.capacity]),
+                  str(self.times[(self.head + end - 1) % self.capacity]),
+                  str(waterings)]
+        for column in range(5):
+            fields.append(f"{mins[column] / scale:.2f}")
+            fields.append(f"{sums[column] / count / scale:.2f}")
+            fields.append(f"{maxs[column] / scale:.2f}")
+        return ('' if isFirst else ', ') + '[' + ', '.join(fields) + ']'
+
+    def __firstIndexAtOrAfter(self, t):
+        # binary search over the ring, samples are recorded in chronological order
+        low, high = 0, self.count
+        while low < high:
+            mid = (low + high) // 2
+            if self.times[(self.head + mid) % self.capacity] < t:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+    def __toFixed(self, value):
+        value = int(round(value * ControllerTelemetry.SCALE))
+        return max(-ControllerTelemetry.VALUE_MAX, min(ControllerTelemetry.VALUE_MAX, value))
@@ -1,14 +1,118 @@
 from machine import Pin, UART
+import uasyncio as asyncio
+import time
+import loopmonitor
 
 class UartConsole():
-    def __init__(self, uart_id: int, tx_pin: int, rx_pin: int, print_output=False, baudrate=115200):
+    """
+    Non-blocking console: write() only copies the line into a preallocated ring buffer, a separate task
+    drains it to the UART through asyncio.StreamWriter. Lines below the configured level are ignored,
+    identical consecutive lines are merged into a single "repeated" note, and lines that don't fit
+    in the buffer or exceed the rate limit are dropped and counted (errors are never rate limited).
+    The number of dropped lines is noted in the output before the next line that gets through.
+    With print_output the drained data is echoed to stdout as well.
+    """
+    LEVEL_DEBUG = 0
+    LEVEL_INFO = 1
+    LEVEL_WARNING = 2
+    LEVEL_ERROR = 3
+    LEVEL_PREFIXES = ("[DBG] ", "", "[WRN] ", "[ERR] ")
+
+    def __init__(self, uart_id: int, tx_pin: int, rx_pin: int, print_output=False, baudrate=115200,
+                 buffer_size=2048, level=LEVEL_INFO, max_lines_per_sec=20):
         self.uart = UART(uart_id, baudrate=baudrate, tx=Pin(tx_pin), rx=Pin(rx_pin))
         self.uart.init(bits=8, parity=None, stop=1)
         self.print_output = print_output
+        self.level = level
+        self.max_lines_per_sec = max_lines_per_sec
+
+        # ring buffer state
+        self.buffer = bytearray(buffer_size)
+        self.buffer_view = memoryview(self.buffer)
+        self.head = 0
+        self.used = 0
+
+        # statistics and rate limiting
+        self.dropped_lines = 0
+        self.reported_drops = 0 # dropped_lines already noted in the output
+        self.merged_lines = 0
+        self.last_line = None
+        self.repeat_count = 0
+        self.rate_window_start = time.ticks_ms()
+        self.rate_window_lines = 0
+
+        self.data_ready = asyncio.Event()
+        self.writer = asyncio.StreamWriter(self.uart, {})
+        asyncio.create_task(loopmonitor.track('console', self.run_task()))
+
+    def write(self, buf, level=LEVEL_INFO):
+        if level < self.level:
+            return 0
+        if buf == self.last_line:
+            self.repeat_count += 1
+            self.merged_lines += 1
+            return 0
+        self.__flush_repeats()
+        line = UartConsole.LEVEL_PREFIXES[level] + buf
+        if (level < UartConsole.LEVEL_ERROR) and self.__rate_limited():
+            self.dropped_lines += 1
+            return 0
+        self.__flush_drops()
+        written = self.__enqueue(line.encode() + b'\n')
+        if written:
+            # only a line that made it to the output can be repeated
+            self.last_line = buf
+        return written
+
+    def stats(self):
+        return {'droppedLines': self.dropped_lines, 'mergedLines': self.merged_lines}
+
+    async def run_task(self):
+        while True:
+            await self.data_ready.wait()
+            self.data_ready.clear()
+            while self.used:
+                # drain the contiguous part of the ring, the wrapped part goes in the next round
+                size = min(self.used, len(self.buffer) - self.head)
+                chunk = self.buffer_view[self.head:self.head + size]
+                self.writer.write(chunk)
+                if self.print_output:
+                    # echoed here rather than in write(), so it costs the callers nothing and dropped lines aren't printed
+                    print(bytes(chunk).decode('utf-8', 'replace'), end='')
+                await self.writer.drain()
+                self.head = (self.head + size) % len(self.buffer)
+                self.used -= size
+
+    def __flush_repeats(self):
+        if self.repeat_count:
+            count = self.repeat_count
+            self.repeat_count = 0
+            self.__enqueue(f"(last message repeated {count} times)\n".encode())
+
+    def __flush_drops(self):
+        # notes the lines dropped since the last note, before the next line that gets through
+        count = self.dropped_lines - self.reported_drops
+        if count and self.__enqueue(f"({count} lines dropped)\n".encode()):
+            self.reported_drops = self.dropped_lines
+
+    def __rate_limited(self):
+        now = time.ticks_ms()
+        if time.ticks_diff(now, self.rate_window_start) >= 1000:
+            self.rate_window_start = now
+            self.rate_window_lines = 0
+        self.rate_window_lines += 1
+        return self.rate_window_lines > self.max_lines_per_sec
 
-    def write(self, buf):
-        if self.print_output:
-            print(buf)
-        if not self.uart:
+    def __enqueue(self, data):
+        size = len(self.buffer)
+        if len(data) > size - self.used:
+            self.dropped_lines += 1
             return 0
-        return self.uart.write(buf + '\n')
+        tail = (self.head + self.used) % size
+        first = min(len(data), size - tail)
+        self.buffer[tail:tail + first] = data[:first]
+        if first < len(data):
+            self.buffer[0:len(data) - first] = data[first:]
+        self.used += len(data)
+        self.data_ready.set()
+        return len(data)
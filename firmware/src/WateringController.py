@@ -1,3 +1,55 @@
+from array import array
+try:
+    from WateringSchedule import WateringSchedule
+except ImportError:
+    from .WateringSchedule import WateringSchedule
+
+class EventLog:
+    """
+    Sorted ring buffer of event timestamps, backed by an array.
+    Old events are dropped from the front by moving the head index, so trimming costs O(expired events)
+    and counting costs O(1), without allocating anything until the buffer has to grow.
+    """
+    def __init__(self, events=None, capacity=16):
+        events = sorted(events) if events else []
+        while capacity < len(events):
+            capacity *= 2
+        self.buffer = array('L', [0] * capacity) # unsigned 32-bit on the Pico, enough for timestamps until 2106
+        self.head = 0
+        self.count = 0
+        for t in events:
+            self.append(t)
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if not (0 <= index < self.count):
+            raise IndexError("event log index out of range")
+        return self.buffer[(self.head + index) % len(self.buffer)]
+
+    def __iter__(self):
+        for index in range(self.count):
+            yield self.buffer[(self.head + index) % len(self.buffer)]
+
+    def append(self, t):
+        # events must be appended in chronological order to keep the buffer sorted
+        capacity = len(self.buffer)
+        if self.count == capacity:
+            self.buffer = array('L', list(self) + [0] * capacity)
+            self.head = 0
+            capacity *= 2
+        self.buffer[(self.head + self.count) % capacity] = t
+        self.count += 1
+
+    def trim(self, cutoff):
+        # drops all events not newer than cutoff
+        capacity = len(self.buffer)
+        while self.count and (self.buffer[self.head] <= cutoff):
+            self.head = (self.head + 1) % capacity
+            self.count -= 1
+
+
 class WateringController:
     # Constants
     SECONDS_IN_DAY = 86400
@@ -8,61 +60,162 @@ class WateringController:
         kimax[>0]: maximum absolute value for integral part, as a portion of single liters_per_event. Can also be larger than 1.
         kidec[0..1]: portion of kimax that gets decreased from integral part on every watering event
         """
-        # configs
+        self.configure(setpoint, liters_per_event, deadtime_sec, watering_windows, time_window_days, kp, ki, kd, kimax, kidec)
+
+        # pid state
+        self.integral_error = 0.0
+        self.last_error = 0.0
+        self.last_event_time = 0
+
+        # event logs to estimate average watering
+        self.event_log = EventLog(load_event_log_callback() if load_event_log_callback else None)
+        self.store_event_log_callback = store_event_log_callback
+
+    def configure(self, setpoint, liters_per_event, deadtime_sec, watering_windows, time_window_days, kp, ki, kd, kimax, kidec):
+        """
+        Sets the parameters (same as in the constructor) in place, the PID state and the event log are kept.
+        The integral part is clamped to the new limit on the next iteration.
+        """
+        schedule, integral_max = WateringController.derive_params(setpoint, liters_per_event, deadtime_sec, watering_windows,
+                                                                  time_window_days, kp, ki, kd, kimax, kidec)
         self.setpoint = setpoint
         self.liters_per_event = liters_per_event
         self.deadtime_sec = deadtime_sec
         self.watering_windows = watering_windows
+        self.schedule = schedule
         self.time_window_days = time_window_days
+        self.window_sec = time_window_days * WateringController.SECONDS_IN_DAY
         self.kp = kp
         self.ki = ki
-        self.integral_max = (kimax * liters_per_event) / ki
+        self.integral_max = integral_max
         self.integral_dec = kidec
         self.kd = kd
 
-        # pid state
-        self.integral_error = 0.0
-        self.last_error = 0.0
-        self.last_event_time = 0
+    @staticmethod
+    def derive_params(setpoint, liters_per_event, deadtime_sec, watering_windows, time_window_days, kp, ki, kd, kimax, kidec):
+        """
+        Returns (schedule, integral_max) for the given parameters, raises if the controller can't run with them.
+        Doesn't change anything, so it doubles as a dry run of configure().
+        """
+        schedule = WateringSchedule(watering_windows)
+        integral_max = (kimax * liters_per_event) / ki
+        return schedule, integral_max
 
-        # event logs to estimate average watering
-        self.event_log = []
-        if load_event_log_callback:
-            self.event_log = load_event_log_callback()
-        self.store_event_log_callback = store_event_log_callback
+    def get_state(self):
+        # PID state to be checkpointed across reboots (the event log is stored separately)
+        return self.integral_error, self.last_error, self.last_event_time
+
+    def set_state(self, integral_error, last_error, last_event_time):
+        self.integral_error = integral_error
+        self.last_error = last_error
+        self.last_event_time = last_event_time
 
     def run_single_iteration(self, current_time_seconds):
         self.__trim_old_events(current_time_seconds)
-        current_average = self.__get_daily_average()
-        control, pid_values = self.__pid_update(current_average, self.setpoint)
+        control_reached, outputs = self._pid_update()
 
         is_outside_deadtime = current_time_seconds - self.last_event_time >= self.deadtime_sec
         should_water = self.__is_within_window(current_time_seconds) \
                         and is_outside_deadtime \
-                        and control >= self.liters_per_event
+                        and control_reached
         if should_water:
             self.__add_new_event(current_time_seconds)
-            self.integral_error -= self.integral_dec * self.integral_max #decrease the integral a bit so it doesn't get triggered again instantly
+            self._decrease_integral()
+
+        return should_water, outputs
 
-        return should_water, (current_average, control, pid_values)
+    def advance(self, current_time_seconds, steps, seconds_per_step=60):
+        """
+        Fast-forwards the controller by given number of iterations, same as calling run_single_iteration()
+        at current_time_seconds + k * seconds_per_step for k in range(steps), provided that none of them
+        can water (all are before get_next_watering_time()). The state ends up exactly the same as after stepping.
+        Not a closed form: the integral is still added once per skipped iteration until it reaches its limit
+        (only the rest is skipped at once), as a closed form would round differently than stepping does.
+        It costs O(expired events + iterations until the integral limit), so O(steps) in the worst case of an
+        integral that doesn't saturate, but with a float addition per step instead of a full iteration.
+        Returns the same values as run_single_iteration() would for the last iteration.
+        """
+        result = None
+        while steps > 0:
+            self.__trim_old_events(current_time_seconds)
+            iterations = steps
+            if self.event_log:
+                iterations = min(iterations, self.__steps_until_expiry(self.event_log[0], current_time_seconds, seconds_per_step))
+            _, result = self._pid_update(iterations)
+            current_time_seconds += iterations * seconds_per_step
+            steps -= iterations
+        return False, result
+
+    def run_iterations(self, current_time_seconds, steps, seconds_per_step=60):
+        """
+        Same as calling run_single_iteration() at current_time_seconds + k * seconds_per_step for k in range(steps),
+        but the iterations that can't water are skipped with advance(). Returns the watering times.
+        """
+        events = []
+        while steps > 0:
+            next_time = self.get_next_watering_time(current_time_seconds)
+            idle_steps = steps if next_time is None else min(steps, int(-((current_time_seconds - next_time) // seconds_per_step)))
+            if idle_steps > 0:
+                self.advance(current_time_seconds, idle_steps, seconds_per_step)
+            else:
+                idle_steps = 1
+                if self.run_single_iteration(current_time_seconds)[0]:
+                    events.append(current_time_seconds)
+            current_time_seconds += idle_steps * seconds_per_step
+            steps -= idle_steps
+        return events
+
+    def get_next_watering_time(self, current_time_seconds):
+        """
+        Returns the earliest time (>= current_time_seconds) at which run_single_iteration() could possibly water,
+        regarding watering windows and deadtime only. Returns None if there are no watering windows.
+        """
+        t = max(current_time_seconds, self.last_event_time + self.deadtime_sec)
+        if t != int(t):
+            t = int(t) + 1 # the schedule works on whole seconds
+        return self.schedule.next_opening(t)
+
+    def __get_cutoff(self, current_time_seconds):
+        return int(current_time_seconds - self.window_sec)
+
+    def __steps_until_expiry(self, event_time, current_time_seconds, seconds_per_step):
+        # smallest k >= 1 such that the event gets trimmed at current_time_seconds + k * seconds_per_step
+        k = max(1, int(-((current_time_seconds - self.window_sec - event_time) // seconds_per_step)))
+        # correct the float estimate using the exact cutoff formula
+        while (k > 1) and (self.__get_cutoff(current_time_seconds + (k - 1) * seconds_per_step) >= event_time):
+            k -= 1
+        while self.__get_cutoff(current_time_seconds + k * seconds_per_step) < event_time:
+            k += 1
+        return k
 
     def __trim_old_events(self, current_time_seconds):
-        cutoff = int(current_time_seconds - self.time_window_days * WateringController.SECONDS_IN_DAY)
-        self.event_log = [t for t in self.event_log if t > cutoff]
+        self.event_log.trim(self.__get_cutoff(current_time_seconds))
 
     def __add_new_event(self, current_time_seconds):
         self.event_log.append(current_time_seconds)
         self.last_event_time = current_time_seconds
         if self.store_event_log_callback:
-            self.store_event_log_callback(self.event_log)
+            self.store_event_log_callback(list(self.event_log))
 
-    def __get_daily_average(self):
-        return (len(self.event_log) * self.liters_per_event) / self.time_window_days
-
-    def __pid_update(self, current_value, setpoint_value):
-        error = setpoint_value - current_value
+    def _pid_update(self, iterations=1):
+        """
+        Runs the PID for given number of iterations with the current event log (the error stays the same).
+        Returns (whether control reached liters_per_event, (current_average, control, (p, i, d))) of the last one.
+        """
+        current_average = (len(self.event_log) * self.liters_per_event) / self.time_window_days
+        error = self.setpoint - current_average
         self.integral_error += error
         self.integral_error = max(min(self.integral_error, self.integral_max), -self.integral_max)
+        if iterations > 1:
+            # with constant error the integral moves monotonically until it is clamped, and then stays there.
+            # The additions before that are repeated one by one: a closed form would round differently
+            # and could flip a later decision when control lands right at liters_per_event
+            limit = self.integral_max if error > 0 else -self.integral_max
+            remaining = iterations - 1
+            while remaining and error and (self.integral_error != limit):
+                self.integral_error = max(min(self.integral_error + error, self.integral_max), -self.integral_max)
+                remaining -= 1
+            self.last_error = error
         derivative = error - self.last_error
         self.last_error = error
 
@@ -70,11 +223,97 @@ class WateringController:
         i = self.ki * self.integral_error
         d = self.kd * derivative
         control = p + i + d
-        return control, (p, i, d)
+        return control >= self.liters_per_event, (current_average, control, (p, i, d))
+
+    def _decrease_integral(self):
+        # after a watering event, so it doesn't get triggered again instantly
+        self.integral_error -= self.integral_dec * self.integral_max
 
     def __is_within_window(self, current_time_seconds):
-        seconds_since_midnight = current_time_seconds % WateringController.SECONDS_IN_DAY
-        for wstart, wstop in self.watering_windows:
-            if wstart <= seconds_since_midnight <= wstop:
-                return True
-        return False
+        return self.schedule.is_open(current_time_seconds)
+
+
+
+class FixedPointWateringController(WateringController):
+    """
+    Drop-in variant of WateringController (same parameters, methods and state) with integer PID arithmetic, for
+    MicroPython where every float is a heap object. Liter values are fixed-point integers scaled by ONE. The error
+    only changes with the event count, so its terms are computed (with the same float formulas as WateringController)
+    only when the count changes, and the iterations in between only do small-int arithmetic on the integral.
+    Integer additions are exact, so advance() adds the integral of all skipped iterations at once: O(expired events).
+    The integral is kept multiplied by ki and scaled by 2**INTEGRAL_BITS, so it stays a small int up to
+    kimax * liters_per_event = 16 l. integral_error and last_error read and write the same values as in
+    WateringController, which keeps get_state()/set_state() (and the stored state) interchangeable.
+
+    Tolerance: the integral increment is rounded to 1/2**INTEGRAL_BITS liter, once per iteration, and the outputs to
+    1/ONE liter. helpers/fixed_point_check.py measures the control difference to WateringController, decisions only
+    differ when the float control is that close to liters_per_event.
+    """
+    FRACTION_BITS = 20
+    ONE = 1 << FRACTION_BITS
+    INTEGRAL_BITS = 26
+    INTEGRAL_SHIFT = INTEGRAL_BITS - FRACTION_BITS
+
+    # zero state seen by the first configure(), called before the state is set
+    integral = 0
+    integral_scale = 1.0
+    last_error_fixed = 0
+
+    def configure(self, setpoint, liters_per_event, deadtime_sec, watering_windows, time_window_days, kp, ki, kd, kimax, kidec):
+        integral_error = self.integral_error
+        super().configure(setpoint, liters_per_event, deadtime_sec, watering_windows, time_window_days, kp, ki, kd, kimax, kidec)
+        integral_one = 1 << FixedPointWateringController.INTEGRAL_BITS
+        self.liters_per_event_fixed = round(liters_per_event * FixedPointWateringController.ONE)
+        self.integral_limit = round(kimax * liters_per_event * integral_one)
+        self.integral_dec_fixed = round(kidec * kimax * liters_per_event * integral_one)
+        # kept in WateringController units, so it gets rescaled to the new ki (and clamped on the next iteration)
+        self.integral_scale = ki * integral_one
+        self.integral_error = integral_error
+        self.count_terms = None # (count, average, error, p, p fixed, integral increment), recomputed on the next iteration
+
+    @property
+    def integral_error(self):
+        return self.integral / self.integral_scale
+
+    @integral_error.setter
+    def integral_error(self, value):
+        self.integral = round(value * self.integral_scale)
+
+    @property
+    def last_error(self):
+        return self.last_error_fixed / FixedPointWateringController.ONE
+
+    @last_error.setter
+    def last_error(self, value):
+        self.last_error_fixed = round(value * FixedPointWateringController.ONE)
+
+    def _pid_update(self, iterations=1):
+        one = FixedPointWateringController.ONE
+        count = self.event_log.count
+        terms = self.count_terms
+        if (terms is None) or (terms[0] != count):
+            average = (count * self.liters_per_event) / self.time_window_days
+            error = self.setpoint - average
+            p = self.kp * error
+            terms = self.count_terms = (count, average, round(error * one), p, round(p * one), round(error * self.integral_scale))
+        _, average, error, p, p_fixed, increment = terms
+
+        limit = self.integral_limit
+        integral = max(min(self.integral + increment, limit), -limit)
+        if iterations > 1:
+            # with constant increment clamping once at the end is the same as after every addition
+            integral = max(min(integral + (iterations - 1) * increment, limit), -limit)
+        self.integral = integral
+
+        d, d_fixed = 0.0, 0
+        if (iterations == 1) and (error != self.last_error_fixed):
+            d = self.kd * (error - self.last_error_fixed) / one
+            d_fixed = round(d * one)
+        self.last_error_fixed = error
+
+        i_fixed = integral >> FixedPointWateringController.INTEGRAL_SHIFT
+        control = p_fixed + i_fixed + d_fixed
+        return control >= self.liters_per_event_fixed, (average, control / one, (p, i_fixed / one, d))
+
+    def _decrease_integral(self):
+        self.integral -= self.integral_dec_fixed
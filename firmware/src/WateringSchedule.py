@@ -0,0 +1,93 @@
+import time
+from array import array
+
+class WateringSchedule:
+    """
+    Weekly index of watering windows. Accepts either a single list of (start, stop) pairs used for every day,
+    or a list of 7 such lists (Monday first). Both ends are whole seconds since midnight and are inclusive.
+    Windows are validated, merged and sorted once, so checking for an open window and finding the next
+    opening both cost O(log n).
+    Timestamps are seconds since epoch, or since time_base if given (to keep them small ints on MicroPython).
+    """
+    SECONDS_IN_DAY = 86400
+    DAYS_IN_WEEK = 7
+    SECONDS_IN_WEEK = DAYS_IN_WEEK * SECONDS_IN_DAY
+    EPOCH_WEEKDAY = time.gmtime(0)[6] # 0 = Monday, differs between 1970 and 2000 epoch ports
+
+    def __init__(self, windows, time_base = 0):
+        if not WateringSchedule.validate(windows):
+            raise ValueError("Invalid watering windows")
+        intervals = []
+        for day, day_windows in enumerate(WateringSchedule.__per_weekday(windows)):
+            for wstart, wstop in day_windows:
+                intervals.append((day * WateringSchedule.SECONDS_IN_DAY + wstart, day * WateringSchedule.SECONDS_IN_DAY + wstop))
+        intervals.sort()
+
+        self.starts = array('l')
+        self.stops = array('l')
+        for wstart, wstop in intervals:
+            # integer seconds, so windows that touch are merged as well
+            if len(self.starts) and (wstart <= self.stops[-1] + 1):
+                self.stops[-1] = max(self.stops[-1], wstop)
+            else:
+                self.starts.append(wstart)
+                self.stops.append(wstop)
+        self.offset = (time_base + WateringSchedule.EPOCH_WEEKDAY * WateringSchedule.SECONDS_IN_DAY) % WateringSchedule.SECONDS_IN_WEEK
+
+    @staticmethod
+    def validate(windows):
+        try:
+            days = WateringSchedule.__per_weekday(windows)
+            for day_windows in days:
+                for wstart, wstop in day_windows:
+                    if (type(wstart) != int) or (type(wstop) != int) or not (0 <= wstart <= wstop < WateringSchedule.SECONDS_IN_DAY):
+                        return False
+            return True
+        except (TypeError, ValueError):
+            return False
+
+    def week_seconds(self, t):
+        # seconds since Monday 00:00
+        return (t + self.offset) % WateringSchedule.SECONDS_IN_WEEK
+
+    def is_open(self, t):
+        seconds = self.week_seconds(t)
+        index = self.__last_started_index(seconds)
+        return (index >= 0) and (seconds <= self.stops[index])
+
+    def next_opening(self, t):
+        """
+        Returns t if a window is open at t, otherwise the time when the next window opens. None if there are no windows.
+        """
+        if not len(self.starts):
+            return None
+        seconds = self.week_seconds(t)
+        index = self.__last_started_index(seconds)
+        if (index >= 0) and (seconds <= self.stops[index]):
+            return t
+        if index + 1 < len(self.starts):
+            return t + self.starts[index + 1] - seconds
+        return t + WateringSchedule.SECONDS_IN_WEEK + self.starts[0] - seconds
+
+    def __last_started_index(self, seconds):
+        # binary search for the last window with start <= seconds, -1 if none
+        low, high = 0, len(self.starts)
+        while low < high:
+            mid = (low + high) // 2
+            if self.starts[mid] <= seconds:
+                low = mid + 1
+            else:
+                high = mid
+        return low - 1
+
+    @staticmethod
+    def __per_weekday(windows):
+        # daily form: [(start, stop), ...], weekly form: [[(start, stop), ...], ...] with 7 entries
+        is_weekly = (len(windows) == WateringSchedule.DAYS_IN_WEEK) and \
+                   all((len(day) == 0) or isinstance(day[0], (list, tuple)) for day in windows)
+        if is_weekly:
+            return windows
+        for window in windows:
+            if len(window) != 2:
+                raise ValueError("Window must be a (start, stop) pair")
+        return [windows] * WateringSchedule.DAYS_IN_WEEK
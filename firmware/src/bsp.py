@@ -1,5 +1,7 @@
 import uasyncio as asyncio
 import machine
+import micropython
+import time
 
 VALVE_CLOSE_PIN = 21
 VALVE_OPEN_PIN = 20
@@ -107,16 +109,85 @@ class Led(machine.Pin):
     def __init__(self):
         super().__init__(LED_PIN, machine.Pin.OUT)
         self.off()
+        self.timer = None
+        self.timerCallback = self.__onTimer # bound once, not on every tick
+
+    def blink(self, periodMs: int):
+        # toggled by a soft timer, no task has to wake up for it
+        self.stopBlink()
+        self.timer = machine.Timer(period=periodMs, mode=machine.Timer.PERIODIC, callback=self.timerCallback)
+
+    def stopBlink(self):
+        if self.timer:
+            self.timer.deinit()
+            self.timer = None
+
+    def __onTimer(self, timer):
+        self.toggle()
 
 class Button:
+    """
+    Interrupt driven button. The pin IRQ only schedules __onEdge, which wakes the waiting task through
+    a ThreadSafeFlag. The debounce is done there: the first edge is taken right away (latency of a few ms),
+    the edges within DEBOUNCE_MS after it are bounces and the level is read again once they're over.
+    Released within LONG_PRESS_MS is a short press, otherwise a long one, reported as soon as the hold time
+    is reached. Presses shorter than MIN_PRESS_MS are glitches and ignored.
+    """
+    DEBOUNCE_MS = 20
+    MIN_PRESS_MS = 40
+    LONG_PRESS_MS = 1500
+    PRESS_SHORT = 1
+    PRESS_LONG = 2
+
     def __init__(self, pin: int, activeLow: bool = True):
         pull = machine.Pin.PULL_UP if activeLow else machine.Pin.PULL_DOWN
         self.button = machine.Pin(pin, machine.Pin.IN, pull)
         self.activeLow = activeLow
 
+        self.pressed = self.isPressed() # debounced state
+        self.changeTicks = time.ticks_add(time.ticks_ms(), -Button.DEBOUNCE_MS)
+        self.flag = asyncio.ThreadSafeFlag()
+        self.edgeCallback = self.__onEdge # bound once, the IRQ handler must not allocate
+        self.button.irq(handler=self.__onIrq, trigger=machine.Pin.IRQ_FALLING | machine.Pin.IRQ_RISING, hard=True)
+
     def isPressed(self):
         value = bool(self.button.value())
         # activeLow = 0 and value = 1
         # OR
         # activeLow = 1 and value = 0
-        return bool(self.activeLow ^ value)
\ No newline at end of file
+        return bool(self.activeLow ^ value)
+
+    async def waitPress(self):
+        while True:
+            if not await self.__nextChange():
+                continue # release of a press that was already reported as long
+            pressTicks = self.changeTicks
+            try:
+                await asyncio.wait_for(self.__nextChange(), Button.LONG_PRESS_MS / 1000)
+            except asyncio.TimeoutError:
+                return Button.PRESS_LONG
+            if time.ticks_diff(self.changeTicks, pressTicks) >= Button.MIN_PRESS_MS:
+                return Button.PRESS_SHORT
+
+    async def __nextChange(self):
+        # waits for the debounced state to change, returns the new state
+        while True:
+            settleMs = Button.DEBOUNCE_MS - time.ticks_diff(time.ticks_ms(), self.changeTicks)
+            if settleMs > 0:
+                await asyncio.sleep_ms(settleMs)
+                self.flag.clear() # set by the bounces
+            pressed = self.isPressed()
+            if pressed != self.pressed:
+                self.pressed = pressed
+                self.changeTicks = time.ticks_ms()
+                return pressed
+            await self.flag.wait()
+
+    def __onIrq(self, pin):
+        try:
+            micropython.schedule(self.edgeCallback, None)
+        except RuntimeError:
+            pass # schedule queue full, the flag is set by the other pending edge anyway
+
+    def __onEdge(self, _):
+        self.flag.set()
@@ -2,49 +2,96 @@ try:
     import ujson as json
 except:
     import json
+try:
+    from WateringSchedule import WateringSchedule
+except ImportError:
+    from .WateringSchedule import WateringSchedule
+try:
+    from schema import Schema, Int, Float, Bool, Str, List, Tuple, AnyOf, Check
+except ImportError:
+    from .schema import Schema, Int, Float, Bool, Str, List, Tuple, AnyOf, Check
+import hashlib, binascii
 
 class JsonConfig:
+    SCHEMA = None # compiled once per class, derived from the default config types if not declared
+
     def __init__(self, filePath: str, defaultConfig: dict, console):
         self.filePath = filePath
         self.defaultConfig = defaultConfig
         self.console = console
+        self.schema = self.SCHEMA if self.SCHEMA else Schema.fromDefaults(defaultConfig)
+        self.subscribers = []
+        self.checks = []
         self.values = {} #should not be set directly, use load() or update() instead
+        # serialized publicValues() with its ETag, rebuilt only when values change
+        self.serialized = None
+        self.etag = None
         if not self.load(self.filePath):
             self.update(self.defaultConfig)
 
-    def specificPrecheck(self, values: dict):
-        return True
+    def publicValues(self):
+        # values exposed over HTTP, override to hide secrets
+        return self.values
+
+    def subscribe(self, callback, check=None):
+        # callback(config) is called after every successful update(). check(config, values) is part of validate(),
+        # it returns {field: error message} for values the subscriber couldn't apply, so they are never stored
+        self.subscribers.append(callback)
+        if check:
+            self.checks.append(check)
+
+    def validate(self, values: dict):
+        # {field: error message}, empty if the values are valid
+        errors = self.schema.validate(values)
+        for check in self.checks:
+            if errors:
+                break
+            errors = check(self, values)
+        return errors
 
     def precheck(self, values: dict):
-        try:
-            all_fields_present = all(field in values for field in self.defaultConfig.keys())
-            fields_count_ok = len(values) == len(self.defaultConfig)
-            if (not all_fields_present) or (not fields_count_ok):
-                return False
-            for key in values.keys():
-                value_type = type(values[key])
-                default_type = type(self.defaultConfig[key])
-                if (default_type in [str, int, bool]) and (value_type != default_type):
-                    return False
-                if (default_type == float) and (value_type not in [float, int]):
-                    return False
-            return self.specificPrecheck(values)
-        except Exception as error:
-            self.console.write(f'Exception while precheck: {error}')
-            return False
+        errors = self.validate(values)
+        if errors:
+            self.console.write(f'Invalid values ({self.filePath}): {errors}')
+        return not errors
 
     def load(self, filePath):
         try:
             with open(filePath, 'r') as f:
-                tmp = json.loads(f.read())
-                if self.precheck(tmp):
-                    self.values = tmp.copy()
-                    return True
-                else:
-                    self.console.write(f"Prechecks failed while loading ({filePath})")
+                stored = json.loads(f.read())
         except Exception as error:
             self.console.write(f"Invalid or non-existing file ({filePath})")
-        return False
+            return False
+        if type(stored) != dict:
+            self.console.write(f"Prechecks failed while loading ({filePath})")
+            return False
+        self.values = self.migrate(stored)
+        self.__refreshSerialized()
+        return True
+
+    def migrate(self, stored: dict):
+        # a file written by an older firmware may not pass the current schema, it is kept anyway: only the fields
+        # that are missing or fail their own check fall back to the defaults, the other errors are just reported.
+        # The file is left as it is until the next update().
+        errors = self.validate(stored)
+        if not errors:
+            return stored.copy()
+        self.console.write(f"Stored values don't pass the schema ({self.filePath}): {errors}")
+        values = {}
+        fallbacks = []
+        for key in self.defaultConfig:
+            check = self.schema.fields.get(key)
+            if (key in stored) and ((check is None) or (check(stored[key]) is None)):
+                values[key] = stored[key]
+            else:
+                values[key] = self.defaultConfig[key]
+                fallbacks.append(key)
+        if fallbacks:
+            self.console.write(f"Using defaults for {fallbacks} ({self.filePath})")
+        errors = self.validate(values)
+        if errors:
+            self.console.write(f"Keeping stored values that don't pass the schema ({self.filePath}): {errors}")
+        return values
 
     def update(self, rawValues: dict):
         if not self.precheck(rawValues):
@@ -55,14 +102,34 @@ class JsonConfig:
             with open(self.filePath, 'w') as f:
                 f.write(json.dumps(rawValues))
             self.values = rawValues.copy()
+            self.__refreshSerialized()
             self.console.write(f"Updated config ({self.filePath})")
-            return True
         except Exception as error:
             self.console.write(f"Error during updating ({self.filePath})")
-        return False
+            return False
+        self.__notify()
+        return True
+
+    def __notify(self):
+        for callback in self.subscribers:
+            try:
+                callback(self)
+            except Exception as error:
+                self.console.write(f"Error while applying config ({self.filePath}): {error}")
+
+    def __refreshSerialized(self):
+        self.serialized = json.dumps(self.publicValues())
+        # content based, so ETags stay valid across reboots
+        digest = hashlib.sha256(self.serialized.encode()).digest()
+        self.etag = '"' + binascii.hexlify(digest[:8]).decode() + '"'
 
 
 class WifiConfig(JsonConfig):
+    SCHEMA = Schema({"ssid": Str(1, 32),
+                     "password": Str(1, 64),
+                     "ap_ssid": Str(1, 32),
+                     "ap_password": Str(8, 64)}) # WPA2 needs at least 8 characters
+
     def __init__(self, console):
         defaultConfig = {"ssid": "your-ssid",
                          "password": "your-pass",
@@ -70,14 +137,20 @@ class WifiConfig(JsonConfig):
                          "ap_password": "abecadlo"}
         super().__init__("wifiConfig.json", defaultConfig, console)
 
-    def specificPrecheck(self, values: dict):
-        return (values['ssid'] != "") and \
-               (values['password'] != "") and \
-               (values['ap_ssid'] != "") and \
-               (values['ap_password'] != "")
+    def publicValues(self):
+        values = self.values.copy()
+        values['password'] = "___"
+        values['ap_password'] = "___"
+        return values
 
 
 class HwConfig(JsonConfig):
+    SCHEMA = Schema({"water_pump_time_s": Int(1),
+                     "water_pump_duty_percent": Int(1, 100),
+                     "nutrients_pump_volume_ml": Int(1),
+                     "nutrients_pump_duty_percent": Int(1, 100),
+                     "valve_closing_time_s": Int(1)})
+
     def __init__(self, console):
         defaultConfig = {"water_pump_time_s": 40,
                          "water_pump_duty_percent": 50,
@@ -86,17 +159,26 @@ class HwConfig(JsonConfig):
                          "valve_closing_time_s": 7}
         super().__init__("hwConfig.json", defaultConfig, console)
 
-    def specificPrecheck(self, values: dict):
-        return (values['water_pump_time_s'] > 0) and \
-               (values['water_pump_duty_percent'] > 0) and \
-               (values['water_pump_duty_percent'] <= 100) and \
-               (values['nutrients_pump_volume_ml'] > 0) and \
-               (values['nutrients_pump_duty_percent'] > 0) and \
-               (values['nutrients_pump_duty_percent'] <= 100) and \
-               (values['valve_closing_time_s'] > 0)
 
+_SECOND_OF_DAY = Int(0, WateringSchedule.SECONDS_IN_DAY - 1)
+_WINDOW = Check(Tuple(_SECOND_OF_DAY, _SECOND_OF_DAY), lambda w: w[0] <= w[1], "start must not be after stop")
+_DAILY_WINDOWS = List(_WINDOW)
 
 class ControlConfig(JsonConfig):
+    SCHEMA = Schema({"setpoint": Float(0, exclusiveMinimum=True),
+                     "deadtime_sec": Int(1),
+                     # same windows every day, or a list for every weekday (Monday first)
+                     "watering_windows": AnyOf(_DAILY_WINDOWS, List(_DAILY_WINDOWS, 7, 7)),
+                     "time_window_days": Float(0, exclusiveMinimum=True),
+                     "kp": Float(0),
+                     "ki": Float(0, exclusiveMinimum=True), # the integral limit is divided by it
+                     "kimax": Float(0),
+                     "kidec": Float(0),
+                     "kd": Float(0),
+                     "fixed_point": Bool()}, # FixedPointWateringController instead of WateringController
+                    rules=((lambda v: v["deadtime_sec"] < v["time_window_days"] * WateringSchedule.SECONDS_IN_DAY,
+                            "deadtime_sec", "must be shorter than time_window_days"),))
+
     def __init__(self, console):
         defaultConfig = {"setpoint": 4.0,
                          "deadtime_sec": 10*60,
@@ -106,16 +188,6 @@ class ControlConfig(JsonConfig):
                          "ki": 0.001,
                          "kimax": 1.0,
                          "kidec": 0.1,
-                         "kd": 0.0}
+                         "kd": 0.0,
+                         "fixed_point": False}
         super().__init__("controlConfig.json", defaultConfig, console)
-
-    def specificPrecheck(self, values: dict):
-        #TODO check watering windows
-        return (values['setpoint'] > 0) and \
-               (values['deadtime_sec'] > 0) and \
-               (values['time_window_days'] > 0) and \
-               (values['kp'] >= 0) and \
-               (values['ki'] >= 0) and \
-               (values['kimax'] >= 0) and \
-               (values['kidec'] >= 0) and \
-               (values['kd'] >= 0)
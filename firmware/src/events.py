@@ -0,0 +1,51 @@
+import uasyncio as asyncio
+try:
+    import ujson as json
+except:
+    import json
+
+# Live device events for the /events Server-Sent Events endpoint.
+# publish() never blocks: every subscriber has a bounded queue, the oldest events are dropped (and counted)
+# when a client can't keep up, and the number of subscribers is capped.
+
+MAX_SUBSCRIBERS = 3
+QUEUE_SIZE = 8
+
+_subscribers = []
+
+class Subscriber:
+    def __init__(self, types):
+        self.types = types # None means all event types
+        self.queue = []
+        self.dropped = 0
+        self.ready = asyncio.Event()
+
+    def push(self, eventType: str, data: str):
+        if self.types and (eventType not in self.types):
+            return
+        if len(self.queue) >= QUEUE_SIZE:
+            self.queue.pop(0)
+            self.dropped += 1
+        self.queue.append((eventType, data))
+        self.ready.set()
+
+def isFull():
+    return len(_subscribers) >= MAX_SUBSCRIBERS
+
+def subscribe(types=None):
+    if isFull():
+        return None
+    subscriber = Subscriber(types)
+    _subscribers.append(subscriber)
+    return subscriber
+
+def unsubscribe(subscriber: Subscriber):
+    if subscriber in _subscribers:
+        _subscribers.remove(subscriber)
+
+def publish(eventType: str, data: dict):
+    if not _subscribers:
+        return
+    serialized = json.dumps(data) # once for all subscribers
+    for subscriber in _subscribers:
+        subscriber.push(eventType, serialized)
@@ -0,0 +1,88 @@
+import uasyncio as asyncio
+import loopmonitor
+
+# Background jobs for slow webserver operations, so the request can return a job id right away.
+# At most MAX_RUNNING jobs run at once, the rest wait in FIFO order. Every job has a timeout,
+# which can only interrupt it at await points: a blocking call inside a job still blocks the loop.
+
+MAX_RUNNING = 1
+MAX_JOBS = 16 # finished jobs are forgotten (oldest first) above this count
+
+STATE_QUEUED = 'queued'
+STATE_RUNNING = 'running'
+STATE_DONE = 'done'
+STATE_FAILED = 'failed'
+STATE_TIMEOUT = 'timeout'
+
+_jobs = []
+_queue = []
+_running = 0
+_nextId = 1
+
+class Job:
+    def __init__(self, jobId: int, name: str, function, timeoutSec):
+        self.id = jobId
+        self.name = name
+        self.function = function # function(job), sync or async, may update job.progress
+        self.timeoutSec = timeoutSec
+        self.state = STATE_QUEUED
+        self.progress = 0
+        self.result = None
+        self.error = None
+
+    def toDict(self):
+        return {'id': self.id, 'name': self.name, 'state': self.state,
+                'progress': self.progress, 'result': self.result, 'error': self.error}
+
+def submit(name: str, function, timeoutSec=30):
+    global _nextId
+    job = Job(_nextId, name, function, timeoutSec)
+    _nextId += 1
+    _jobs.append(job)
+    _forgetFinished()
+    _queue.append(job)
+    _startNext()
+    return job
+
+def get(jobId: int):
+    for job in _jobs:
+        if job.id == jobId:
+            return job
+    return None
+
+def _startNext():
+    global _running
+    while _queue and (_running < MAX_RUNNING):
+        _running += 1
+        asyncio.create_task(loopmonitor.track('jobs', _run(_queue.pop(0))))
+
+async def _call(job: Job):
+    result = job.function(job)
+    if hasattr(result, 'send'): # coroutine or generator based async function
+        result = await result
+    return result
+
+async def _run(job: Job):
+    global _running
+    job.state = STATE_RUNNING
+    try:
+        job.result = await asyncio.wait_for(_call(job), job.timeoutSec)
+        job.progress = 100
+        job.state = STATE_DONE
+    except asyncio.TimeoutError:
+        job.state = STATE_TIMEOUT
+        job.error = f"Timeout after {job.timeoutSec}s"
+    except Exception as e:
+        job.state = STATE_FAILED
+        job.error = str(e)
+    finally:
+        _running -= 1
+        _startNext()
+
+def _forgetFinished():
+    index = 0
+    while (len(_jobs) > MAX_JOBS) and (index < len(_jobs)):
+        if _jobs[index].state in (STATE_QUEUED, STATE_RUNNING):
+            index += 1
+        else:
+            _jobs.pop(index)
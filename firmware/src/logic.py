@@ -1,22 +1,40 @@
 import uasyncio as asyncio
 from bsp import *
 from config import *
-from WateringController import WateringController
+from WateringController import WateringController, FixedPointWateringController
+from EventLogStore import EventLogStore
+from ControllerStateStore import ControllerStateStore
+from scheduler import SystemClock, UptimeCounter, MinuteScheduler
+from Telemetry import ControllerTelemetry
 import mytime
+import status as deviceStatus
+import events
+import loopmonitor
 
 class Logic:
+    TELEMETRY_CAPACITY = 3 * 24 * 60 # 3 days of minute samples
+    STATE_INTEGRAL_TOLERANCE = 0.05 # portion of the integral limit, smaller changes aren't worth a flash write
+
     STATUS_IDLE = 0
     STATUS_VALVE_CLOSING = 1
     STATUS_PUMPS_RUNNING = 2
     STATUS_VALVE_OPENING = 3
+    STATUS_NAMES = ("idle", "valve closing", "pumps running", "valve opening")
 
     def __init__(self, console):
-        self.uptime = 0
+        self.clock = SystemClock()
+        self.uptimeCounter = UptimeCounter(self.clock)
         self.wateringCount = 0
 
         self.manualTriggerFlag = False
+        self.manualTriggerEvent = asyncio.Event()
         self.lastTriggerUptime = 0
         self.status = self.STATUS_IDLE
+        self.minuteScheduler = MinuteScheduler()
+        self.missedControllerMinutes = 0
+        self.lastTickLateMs = 0
+        self.maxTickLateMs = 0
+        self.telemetry = ControllerTelemetry(self.TELEMETRY_CAPACITY)
         
         self.valve = Valve(console)
         self.waterPump = WaterPump()
@@ -24,85 +42,174 @@ class Logic:
         self.controlConfig = ControlConfig(console)
         self.hwConfig = HwConfig(console)
 
-        liters_per_event = 4.0 #TODO calculate based on hw config and bsp
-        self.controllerPrescalerCounter = 0 #TODO to be removed when triggering logic changes
-        self.controller = WateringController(self.controlConfig.values["setpoint"],
-                                             liters_per_event,
-                                             self.controlConfig.values["deadtime_sec"],
-                                             self.controlConfig.values["watering_windows"],
-                                             self.controlConfig.values["time_window_days"],
-                                             self.controlConfig.values["kp"],
-                                             self.controlConfig.values["ki"],
-                                             self.controlConfig.values["kd"],
-                                             self.controlConfig.values["kimax"],
-                                             self.controlConfig.values["kidec"])
+        self.eventLogStore = EventLogStore("eventLog.bin", console)
+        self.cyclePlan = self.__computeCyclePlan(self.hwConfig.values)
+        self.controller = self.__controllerClass(self.controlConfig.values)(
+            *self.__controllerParams(self.controlConfig.values, self.hwConfig.values), self.eventLogStore.load, self.eventLogStore.store)
+        self.stateStore = ControllerStateStore("controllerState.bin", console)
+        snapshot = self.stateStore.load()
+        if snapshot:
+            savedTime, state = snapshot
+            self.controller.set_state(*state)
+            console.write(f"Restored controller state saved at {savedTime}")
+        # changes are applied right away, the running controller keeps its PID state and event log
+        self.controlConfig.subscribe(self.__applyConfig, self.__checkConfig)
+        self.hwConfig.subscribe(self.__applyConfig, self.__checkConfig)
         self.console = console
-        asyncio.create_task(self.runTask())
+        asyncio.create_task(loopmonitor.track('logic', self.runTask()))
+
+    @property
+    def uptime(self):
+        return self.uptimeCounter.seconds()
+
+    def isBusy(self):
+        # True during a watering cycle, when nothing should block the loop
+        return self.status != self.STATUS_IDLE
 
     def manualTrigger(self):
         self.manualTriggerFlag = True
+        self.manualTriggerEvent.set()
 
     async def runTask(self):
         await self.valve.open()
         while True:
-            await asyncio.sleep(1)
-            self.uptime += 1
-            await self.__handleWatering()
+            await self.__waitForTrigger()
+            await self.__runWateringCycle()
+
+    async def __waitForTrigger(self):
+        # sleeps until the next wall-clock minute or a manual trigger, whichever comes first
+        while not self.__checkTriggers():
+            timeoutMs = self.__msToNextMinute()
+            deadline = self.clock.ticks_add(self.clock.ticks_ms(), timeoutMs)
+            try:
+                await asyncio.wait_for(self.manualTriggerEvent.wait(), timeoutMs / 1000)
+            except asyncio.TimeoutError:
+                self.lastTickLateMs = self.clock.ticks_diff(self.clock.ticks_ms(), deadline)
+                self.maxTickLateMs = max(self.maxTickLateMs, self.lastTickLateMs)
+            self.manualTriggerEvent.clear()
+
+    def __msToNextMinute(self):
+        currentSecond = mytime.getCurrentDateTime()[6]
+        return (MinuteScheduler.SECONDS_IN_MINUTE - currentSecond) * 1000
 
     def __controllerTrigger(self):
         # Triggers single water cycle based on given average water volume poured daily
         # Only triggers within specific time window, and only when time is synchronized with external source
         # Also accounts for dead-time for better water absorption
+        # Evaluated exactly once per wall-clock minute, with the timestamp of the minute start
 
-        if self.__shouldRunSingleIteration():
-            t = mytime.getCurrentSeconds()
-            should_water, _ = self.controller.run_single_iteration(t)
-            return should_water
-        return False
+        if not mytime.isTimeSynced():
+            self.minuteScheduler.reset()
+            return False
+
+        minutes = self.minuteScheduler.due(mytime.getCurrentSeconds())
+        if minutes == 0:
+            return False
+        t = self.minuteScheduler.lastMinuteStart()
+        missedWatering = False
+        if minutes > 1:
+            # minutes missed while the loop was blocked are evaluated now, the ones within watering windows one by one,
+            # and a watering decided in one of them runs late, with this minute
+            self.missedControllerMinutes += minutes - 1
+            missedWatering = bool(self.controller.run_iterations(t - (minutes - 1) * MinuteScheduler.SECONDS_IN_MINUTE,
+                                                                 minutes - 1, MinuteScheduler.SECONDS_IN_MINUTE))
+        should_water, (current_average, _, pid_values) = self.controller.run_single_iteration(t)
+        should_water = should_water or missedWatering
+        self.telemetry.record(t, current_average, pid_values, should_water)
+        self.stateStore.store(t, self.controller.get_state(), Logic.STATE_INTEGRAL_TOLERANCE * self.controller.integral_max)
+        p, i, d = pid_values
+        controllerOutputs = {'time': t, 'average': current_average, 'control': p + i + d,
+                             'p': p, 'i': i, 'd': d, 'missedMinutes': self.missedControllerMinutes,
+                             'tickLateMs': self.lastTickLateMs, 'maxTickLateMs': self.maxTickLateMs}
+        deviceStatus.setField('controller', controllerOutputs)
+        events.publish('controller', dict(controllerOutputs, water=should_water))
+        return should_water
+
+    def __computeCyclePlan(self, hw):
+        # all timings of a single cycle, computed once per hw config update
+        nutrientsTimeMs = int(hw['nutrients_pump_volume_ml'] * hw['nutrients_pump_duty_percent'] / NUTRIENTS_PUMP_FLOW_ML_SEC / 100 * 1000)
+        return (hw['valve_closing_time_s'] * 1000,
+                hw['water_pump_duty_percent'], hw['water_pump_time_s'] * 1000,
+                hw['nutrients_pump_duty_percent'], nutrientsTimeMs)
+
+    def __litersPerEvent(self, hw):
+        # assumes the flow scales linearly with the duty cycle
+        return WATER_PUMP_FLOW_ML_SEC * hw['water_pump_duty_percent'] / 100 * hw['water_pump_time_s'] / 1000
+
+    def __controllerClass(self, control):
+        return FixedPointWateringController if control["fixed_point"] else WateringController
 
-    async def __handleWatering(self):
-        if (self.status == self.STATUS_IDLE) and self.__checkTriggers():
-            self.console.write("Trigger detected, running single watering cycle. Closing the valve.")
-            await self.valve.close()
-            self.statusTimestamp = self.uptime
-            self.status = self.STATUS_VALVE_CLOSING
-    
-        if self.status == self.STATUS_VALVE_CLOSING:
-            if self.uptime >= self.statusTimestamp + self.hwConfig.values['valve_closing_time_s']:
-                waterPercent = self.hwConfig.values['water_pump_duty_percent']
-                nutrientsPercent = self.hwConfig.values['nutrients_pump_duty_percent']
-                self.console.write(f"Starting water ({waterPercent}%) and nutrient ({nutrientsPercent}%) pumps")
-                self.waterPump.setPercentValue(waterPercent)
-                self.nutrientsPump.setPercentValue(nutrientsPercent)
-                self.statusTimestamp = self.uptime
-                self.status = self.STATUS_PUMPS_RUNNING
-
-        if self.status == self.STATUS_PUMPS_RUNNING:
-            waterPumpFinished = self.uptime >= self.statusTimestamp + self.hwConfig.values['water_pump_time_s']
-            nutrientsTimeDelta = round(self.hwConfig.values['nutrients_pump_volume_ml'] * self.hwConfig.values['nutrients_pump_duty_percent'] / NUTRIENTS_PUMP_FLOW_ML_SEC / 100)
-            nutrientsPumpFinished = self.uptime >= self.statusTimestamp + nutrientsTimeDelta
-            if waterPumpFinished:
-                self.waterPump.setPercentValue(0)
-            if nutrientsPumpFinished:
-                self.nutrientsPump.setPercentValue(0)
-            if waterPumpFinished and nutrientsPumpFinished:
-                self.console.write("Opening the valve")
-                await self.valve.open()
-                self.status = self.STATUS_VALVE_OPENING
-
-        if self.status == self.STATUS_VALVE_OPENING:
-            self.console.write("Watering cycle finished")
-            self.status = self.STATUS_IDLE
+    def __controllerParams(self, control, hw):
+        return (control["setpoint"], self.__litersPerEvent(hw), control["deadtime_sec"], control["watering_windows"],
+                control["time_window_days"], control["kp"], control["ki"], control["kd"], control["kimax"], control["kidec"])
+
+    def __checkConfig(self, config, values):
+        # dry run of configure() with the new values, before they get stored
+        control = values if config is self.controlConfig else self.controlConfig.values
+        hw = values if config is self.hwConfig else self.hwConfig.values
+        try:
+            WateringController.derive_params(*self.__controllerParams(control, hw))
+        except Exception as error:
+            return {'': f"rejected by the controller: {error}"}
+        return {}
+
+    def __applyConfig(self, config):
+        # a cycle that is already running keeps the plan it started with
+        self.cyclePlan = self.__computeCyclePlan(self.hwConfig.values)
+        params = self.__controllerParams(self.controlConfig.values, self.hwConfig.values)
+        controllerClass = self.__controllerClass(self.controlConfig.values)
+        if type(self.controller) is controllerClass:
+            self.controller.configure(*params)
+        else:
+            # the other arithmetic takes over the PID state and the event log
+            previous = self.controller
+            self.controller = controllerClass(*params, lambda: list(previous.event_log), self.eventLogStore.store)
+            self.controller.set_state(*previous.get_state())
+            self.console.write(f"Switched to {controllerClass.__name__}")
+        self.console.write(f"Applied {config.filePath}, {self.controller.liters_per_event:.2f} l per watering")
+
+    async def __sleepUntil(self, deadline):
+        delay = self.clock.ticks_diff(deadline, self.clock.ticks_ms())
+        if delay > 0:
+            await self.clock.sleep_ms(delay)
+
+    async def __runWateringCycle(self):
+        valveClosingMs, waterPercent, waterTimeMs, nutrientsPercent, nutrientsTimeMs = self.cyclePlan
+
+        self.console.write("Trigger detected, running single watering cycle. Closing the valve.")
+        self.__setStatus(self.STATUS_VALVE_CLOSING)
+        await self.valve.close()
+        await self.clock.sleep_ms(valveClosingMs)
+
+        self.console.write(f"Starting water ({waterPercent}%) and nutrient ({nutrientsPercent}%) pumps")
+        self.__setStatus(self.STATUS_PUMPS_RUNNING)
+        self.waterPump.setPercentValue(waterPercent)
+        self.nutrientsPump.setPercentValue(nutrientsPercent)
+        pumpsStart = self.clock.ticks_ms()
+        # each pump is stopped at its own deadline, counted from the moment both were started
+        for pump, timeMs in sorted(((self.waterPump, waterTimeMs), (self.nutrientsPump, nutrientsTimeMs)), key=lambda p: p[1]):
+            await self.__sleepUntil(self.clock.ticks_add(pumpsStart, timeMs))
+            pump.setPercentValue(0)
+
+        self.console.write("Opening the valve")
+        self.__setStatus(self.STATUS_VALVE_OPENING)
+        await self.valve.open()
+        self.console.write("Watering cycle finished")
+        self.__setStatus(self.STATUS_IDLE)
+
+    def __setStatus(self, status):
+        self.status = status
+        deviceStatus.updateFields({'status': status, 'statusName': self.STATUS_NAMES[status]})
+        events.publish('status', {'status': status, 'statusName': self.STATUS_NAMES[status], 'uptime': self.uptime})
 
     def __checkTriggers(self):
-        if (self.__controllerTrigger() or self.manualTriggerFlag):
+        controllerTriggered = self.__controllerTrigger()
+        if (controllerTriggered or self.manualTriggerFlag):
             self.manualTriggerFlag = False
             self.lastTriggerUptime = self.uptime
             self.wateringCount += 1
+            deviceStatus.updateFields({'wateringCount': self.wateringCount, 'lastTriggerUptime': self.lastTriggerUptime})
+            events.publish('trigger', {'source': 'controller' if controllerTriggered else 'manual',
+                                       'uptime': self.lastTriggerUptime, 'wateringCount': self.wateringCount})
             return True
         return False
-    
-    def __shouldRunSingleIteration(self):
-        # check whether time is synchronised and allow to execute every full minute        
-        currentSecond = mytime.getCurrentDateTime()[6]
-        return mytime.isTimeSynced() and (currentSecond == 0)
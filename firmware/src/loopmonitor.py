@@ -0,0 +1,139 @@
+import uasyncio as asyncio
+import time
+from array import array
+
+# Event loop instrumentation served at /debug/loop. A probe task sleeps PROBE_PERIOD_MS over and over and
+# records how late it wakes up: that's the scheduling lag every sleeping task sees. Tasks started through
+# track() are driven one resume at a time, and the time of every resume (the time the task holds the loop)
+# goes to a histogram of its name, so the one blocking the loop shows up in its max and upper buckets.
+# Everything is kept in fixed arrays and small ints, nothing is allocated per sample.
+
+ENABLED = True # when False, track() returns the coroutine unchanged and the probe isn't started
+PROBE_PERIOD_MS = 100
+
+class Histogram:
+    """
+    Durations in log2 buckets: bucket 0 counts values below BASE_US, bucket k values below BASE_US << k,
+    the last one everything above. The total is split in seconds and microseconds, so it stays a small int.
+    """
+    BASE_US = 16
+    BUCKETS = 18 # up to ~1 s, then the overflow bucket
+
+    def __init__(self):
+        self.buckets = array('L', [0] * Histogram.BUCKETS)
+        self.reset()
+
+    def reset(self):
+        for index in range(Histogram.BUCKETS):
+            self.buckets[index] = 0
+        self.count = 0
+        self.totalSec = 0
+        self.totalUs = 0
+        self.maxUs = 0
+        self.lastUs = 0
+
+    def record(self, us: int):
+        if us < 0:
+            us = 0
+        index = 0
+        value = us // Histogram.BASE_US
+        while value and (index < Histogram.BUCKETS - 1):
+            value >>= 1
+            index += 1
+        self.buckets[index] += 1
+        self.count += 1
+        self.totalUs += us
+        if self.totalUs >= 1000000:
+            self.totalSec += self.totalUs // 1000000
+            self.totalUs %= 1000000
+        if us > self.maxUs:
+            self.maxUs = us
+        self.lastUs = us
+
+    def toDict(self):
+        totalUs = self.totalSec * 1000000 + self.totalUs
+        return {'count': self.count, 'meanUs': totalUs // self.count if self.count else None, 'maxUs': self.maxUs,
+                'lastUs': self.lastUs, 'totalMs': totalUs // 1000, 'buckets': list(self.buckets)}
+
+    @staticmethod
+    def bucketLimitsUs():
+        # upper limit of every bucket, None for the overflow one
+        return [Histogram.BASE_US << index for index in range(Histogram.BUCKETS - 1)] + [None]
+
+
+class _Resumes:
+    # awaitable running a coroutine one step at a time, so every resume can be timed
+    def __init__(self, histogram: Histogram, coroutine):
+        self.histogram = histogram
+        self.coroutine = coroutine
+
+    def __await__(self):
+        coroutine = self.coroutine
+        histogram = self.histogram
+        value = None
+        error = None
+        while True:
+            start = time.ticks_us()
+            try:
+                if error is None:
+                    yielded = coroutine.send(value)
+                else:
+                    yielded = coroutine.throw(error)
+            except StopIteration as stop:
+                return stop.value
+            finally:
+                histogram.record(time.ticks_diff(time.ticks_us(), start))
+            try:
+                value = yield yielded
+                error = None
+            except GeneratorExit:
+                coroutine.close()
+                raise
+            except BaseException as e: # cancellation and other exceptions thrown in go to the task
+                value = None
+                error = e
+
+    __iter__ = __await__ # MicroPython awaits through __iter__
+
+
+lag = Histogram()
+_tasks = {}
+_probeRunning = False
+
+def taskHistogram(name: str):
+    histogram = _tasks.get(name)
+    if histogram is None:
+        histogram = Histogram()
+        _tasks[name] = histogram
+    return histogram
+
+async def _runTracked(histogram: Histogram, coroutine):
+    return await _Resumes(histogram, coroutine)
+
+def track(name: str, coroutine):
+    # to be passed to create_task()/run(), tasks with the same name share a histogram
+    if not ENABLED:
+        return coroutine
+    return _runTracked(taskHistogram(name), coroutine)
+
+async def _probeTask():
+    periodUs = PROBE_PERIOD_MS * 1000
+    while True:
+        deadline = time.ticks_add(time.ticks_us(), periodUs)
+        await asyncio.sleep_ms(PROBE_PERIOD_MS)
+        lag.record(time.ticks_diff(time.ticks_us(), deadline))
+
+def start():
+    global _probeRunning
+    if ENABLED and not _probeRunning:
+        _probeRunning = True
+        asyncio.create_task(_probeTask())
+
+def reset():
+    lag.reset()
+    for name in _tasks:
+        _tasks[name].reset()
+
+def toDict():
+    return {'enabled': ENABLED, 'probePeriodMs': PROBE_PERIOD_MS, 'bucketLimitsUs': Histogram.bucketLimitsUs(),
+            'lag': lag.toDict(), 'tasks': {name: _tasks[name].toDict() for name in _tasks}}
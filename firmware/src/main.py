@@ -3,77 +3,79 @@ from bsp import *
 from config import *
 from logic import Logic
 from wifi import Wifi
+from NetworkManager import NetworkManager
 from UartConsole import UartConsole
-import mytime, webserver
-
-#TODO is it a problem when the user changes ssid/password while being on AP mode, then trying to reconnect?
-# solutions:
-# - reboot the board (easy)
-
-#TODO refactor network logic to be on single class, starting new task inside
-
+import mytime, webserver, loopmonitor
+import status as deviceStatus
 
 class GpioHandler:
-    def __init__(self, manualTriggerCallback, console):
+    LED_BLINK_PERIOD_MS = 500
+
+    def __init__(self, manualTriggerCallback, longPressCallback, console):
         self.manualTriggerCallback = manualTriggerCallback
+        self.longPressCallback = longPressCallback
         self.console = console
         self.led = Led()
+        self.led.blink(GpioHandler.LED_BLINK_PERIOD_MS)
         self.button = Button(TRIGGER_BUTTON_PIN, activeLow=True)
-        asyncio.create_task(self.runTask())
+        asyncio.create_task(loopmonitor.track('gpio', self.runTask()))
 
     async def runTask(self):
+        # sleeps until the button IRQ reports a press
         while True:
-            self.led.toggle()
-            if self.button.isPressed():
+            press = await self.button.waitPress()
+            if press == Button.PRESS_SHORT:
                 self.console.write("Button trigger.")
                 self.manualTriggerCallback()
-            await asyncio.sleep_ms(100)
-
-async def connectWifiOrAp(wifi: Wifi, config: WifiConfig, console):
-    if not wifi.IsConnected():
-        await wifi.Connect(config.values['ssid'], config.values['password'])
-    
-    if not wifi.IsConnected():
-        ap_ssid = config.values['ap_ssid']
-        console.write(f"Starting access point with SSID={ap_ssid}")
-        await wifi.ApStart(ap_ssid, config.values['ap_password'])
-        return False
-    return True
+            else:
+                self.console.write("Button long press, starting access point.")
+                self.longPressCallback()
 
-async def runNetworkTask(wifi: Wifi, config: WifiConfig, console):
-    NETWORK_CONNECT_RERUN_PERIOD_SEC = 10*60
+async def runTimeSyncTask(wifi: Wifi, console):
+    # resync period adapts to the measured RTC drift, see SntpClient.nextSyncDelaySec
+    WIFI_WAIT_PERIOD_SEC = 30
     while(True):
+        if not wifi.IsConnected():
+            await asyncio.sleep(WIFI_WAIT_PERIOD_SEC)
+            continue
         try:
-            isConnected = await connectWifiOrAp(wifi, config, console)
-            if isConnected and not mytime.isTimeSynced():
-                await asyncio.sleep(5)
-                console.write(f"Syncing time with NTP")
-                mytime.syncNtp()
+            client = mytime.sntpClient
+            if await mytime.syncNtp():
+                console.write(f"Time synced with {client.lastServer}: offset {client.lastOffsetMs} ms, delay {client.lastDelayMs} ms")
+            else:
+                console.write(f"NTP sync failed ({client.failures} in a row)")
+            deviceStatus.updateFields({'timeSynced': mytime.isTimeSynced(), 'ntp': client.toDict()})
         except Exception as e:
-            console.write(f"Error while network handling: {str(e)}")
-        await asyncio.sleep(NETWORK_CONNECT_RERUN_PERIOD_SEC)
+            console.write(f"Error while syncing time: {str(e)}")
+        await asyncio.sleep(mytime.sntpClient.nextSyncDelaySec())
 
 async def main():
+    loopmonitor.start()
     console = UartConsole(CONSOLE_UART, CONSOLE_TX_PIN, CONSOLE_RX_PIN, print_output=True)
     wifiConfig = WifiConfig(console)
-    wifi = Wifi(console)
     logic = Logic(console)
-    gpioHandler = GpioHandler(logic.manualTrigger, console)
+    wifi = Wifi(console, busyCheck=logic.isBusy)
 
-    asyncio.create_task(runNetworkTask(wifi, wifiConfig, console))
+    networkManager = NetworkManager(wifi, wifiConfig, console)
+    gpioHandler = GpioHandler(logic.manualTrigger, networkManager.requestAccessPoint, console)
+    asyncio.create_task(loopmonitor.track('timesync', runTimeSyncTask(wifi, console)))
 
-    webserver.start(logic.manualTrigger, logic.controlConfig, logic.hwConfig, wifiConfig, console)
+    webserver.start(logic.manualTrigger, logic.controlConfig, logic.hwConfig, wifiConfig, logic.telemetry, wifi, console)
     console.write('Webserver started')
 
     while True:
         await asyncio.sleep(1)
+        uptime = logic.uptime
+        dateTimeStr = mytime.getCurrentDateTimeStr(True, True)
+        deviceStatus.updateFields({'uptime': uptime, 'time': dateTimeStr, 'timeSynced': mytime.isTimeSynced(),
+                                   'rssi': wifi.GetRssi(), 'console': console.stats()})
         wifiStr = wifi.GetIp() if wifi.IsConnected() else "x"
         apStr = wifi.ApGetIp() if wifi.ApIsReady() else "x"
-        console.write(f"[{mytime.getCurrentDateTimeStr()}][{wifiStr}|{apStr}] Uptime: {logic.uptime:05}   Last watering: {logic.lastTriggerUptime:05}   Watering counter: {logic.wateringCount:03}")
+        console.write(deviceStatus.consoleLine(dateTimeStr, wifiStr, apStr, uptime, logic.lastTriggerUptime, logic.wateringCount))
 
 
 try:
-    asyncio.run(main())
+    asyncio.run(loopmonitor.track('main', main()))
 finally:  # Prevent LmacRxBlk:1 errors.
     #optional cleanup
     asyncio.new_event_loop()
\ No newline at end of file
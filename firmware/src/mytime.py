@@ -1,14 +1,15 @@
-import time, ntptime
+import time
 import ujson as json
 from machine import RTC
+from sntp import SntpClient
 
 UTC_TIMEZONE_OFFSET_SECONDS = 2*3600
+NTP_SERVERS = ('pool.ntp.org', 'time.google.com', 'time.cloudflare.com')
 
 rtc = RTC()
 
-def syncNtp():
-    ntptime.settime()
-    local_time = time.localtime(time.mktime(time.localtime()) + UTC_TIMEZONE_OFFSET_SECONDS)
+def setCurrentSeconds(seconds: int):
+    local_time = time.localtime(seconds)
     rtc.datetime((local_time[0],  # year
                   local_time[1],  # month
                   local_time[2],  # day
@@ -19,6 +20,12 @@ def syncNtp():
                   0               # microsecond
                 ))
 
+sntpClient = SntpClient(NTP_SERVERS, lambda: getCurrentSeconds(), setCurrentSeconds, UTC_TIMEZONE_OFFSET_SECONDS)
+
+async def syncNtp():
+    # True if the RTC was corrected, sntpClient keeps the details (offset, delay, drift)
+    return await sntpClient.sync()
+
 def isTimeSynced():
     # just after startup, the default datetime for this HW is around 01.01.2021
     # this hack quickly determines whether the time is synchronized
@@ -36,7 +43,7 @@ def getCurrentDateTimeStr(printTime=True, printDate=False):
     dt = getCurrentDateTime()
     time_ = f"{dt[4]:02}:{dt[5]:02}:{dt[6]:02}"
     date_ = f"{dt[2]:02}.{dt[1]:02}.{dt[0]:04}"
-    return f"{date_ if printDate else ""}{" " if printDate & printTime else ""}{time_ if printTime else ""}"
+    return f"{date_ if printDate else ''}{' ' if printDate & printTime else ''}{time_ if printTime else ''}"
 
 def setCurrentDateTimeJson(data):
     required_fields = ['year', 'month', 'day', 'hour', 'minute', 'second']
@@ -0,0 +1,71 @@
+import time
+import asyncio
+
+class SystemClock:
+    # ticks_ms based clock of the MicroPython port, replaced by a fake one when running on the host
+    def ticks_ms(self):
+        return time.ticks_ms()
+
+    def ticks_add(self, ticks, delta):
+        return time.ticks_add(ticks, delta)
+
+    def ticks_diff(self, ticks1, ticks2):
+        return time.ticks_diff(ticks1, ticks2)
+
+    async def sleep_ms(self, ms):
+        await asyncio.sleep_ms(ms)
+
+
+class UptimeCounter:
+    """
+    Uptime accumulated from ticks_ms differences on every read, so nothing has to wake up every second
+    to count it. ticks_ms wraps around, so it has to be read at least once per half of the ticks period
+    (a few days on the Pico).
+    """
+    def __init__(self, clock=None):
+        self.clock = clock if clock else SystemClock()
+        self.lastTicks = self.clock.ticks_ms()
+        self.uptimeMs = 0
+
+    def ms(self):
+        now = self.clock.ticks_ms()
+        self.uptimeMs += self.clock.ticks_diff(now, self.lastTicks)
+        self.lastTicks = now
+        return self.uptimeMs
+
+    def seconds(self):
+        return self.ms() // 1000
+
+
+class MinuteScheduler:
+    """
+    Tracks the last evaluated wall-clock minute, so every minute gets evaluated exactly once,
+    also when the loop was blocked over a minute boundary.
+    """
+    SECONDS_IN_MINUTE = 60
+
+    def __init__(self):
+        self.lastMinute = None
+
+    def reset(self):
+        self.lastMinute = None
+
+    def due(self, currentSeconds: int):
+        """
+        Returns number of minutes to evaluate, up to and including the current one (0 if it was already evaluated).
+        """
+        minute = currentSeconds // MinuteScheduler.SECONDS_IN_MINUTE
+        if self.lastMinute is None:
+            self.lastMinute = minute
+            return 1
+        if minute < self.lastMinute:
+            # clock was set back: the current minute is skipped, the ones after it get evaluated again as they come
+            # (the controller's deadtime counts from the last event, so they can't water twice)
+            self.lastMinute = minute
+            return 0
+        count = minute - self.lastMinute
+        self.lastMinute = minute
+        return count
+
+    def lastMinuteStart(self):
+        return self.lastMinute * MinuteScheduler.SECONDS_IN_MINUTE
@@ -0,0 +1,138 @@
+# Declarative validation of JSON configs, shared by the firmware and the host tools (plain Python only).
+# Every spec below is compiled into a closure when the schema is built, i.e. once per config class,
+# so validating a config only runs those closures. A check returns None if the value is fine,
+# otherwise an error message.
+
+def Int(minimum=None, maximum=None):
+    return _number((int,), 'integer', minimum, maximum, False)
+
+def Float(minimum=None, maximum=None, exclusiveMinimum=False):
+    # ints are accepted as well, JSON doesn't tell 1 from 1.0
+    return _number((int, float), 'number', minimum, maximum, exclusiveMinimum)
+
+def _number(types, name, minimum, maximum, exclusiveMinimum):
+    expectedError = f"expected {name}"
+    if minimum is None:
+        minimumError = None
+    else:
+        minimumError = f"must be > {minimum}" if exclusiveMinimum else f"must be >= {minimum}"
+    maximumError = f"must be <= {maximum}"
+
+    def check(value):
+        if type(value) not in types: # bool is an int subclass, but not a valid number here
+            return expectedError
+        if (minimum is not None) and ((value <= minimum) if exclusiveMinimum else (value < minimum)):
+            return minimumError
+        if (maximum is not None) and (value > maximum):
+            return maximumError
+        return None
+    return check
+
+def Bool():
+    def check(value):
+        return None if type(value) == bool else "expected boolean"
+    return check
+
+def Str(minLength=0, maxLength=None):
+    def check(value):
+        if type(value) != str:
+            return "expected string"
+        if len(value) < minLength:
+            return f"must have at least {minLength} characters" if minLength > 1 else "must not be empty"
+        if (maxLength is not None) and (len(value) > maxLength):
+            return f"must have at most {maxLength} characters"
+        return None
+    return check
+
+def List(item, minLength=0, maxLength=None):
+    def check(value):
+        if type(value) not in (list, tuple):
+            return "expected list"
+        if (len(value) < minLength) or ((maxLength is not None) and (len(value) > maxLength)):
+            if minLength == maxLength:
+                return f"expected {minLength} items"
+            return f"expected {minLength} to {maxLength} items" if maxLength is not None else f"expected at least {minLength} items"
+        for index in range(len(value)):
+            error = item(value[index])
+            if error:
+                return f"item {index}: {error}"
+        return None
+    return check
+
+def Tuple(*items):
+    # fixed length list, every position with its own spec (JSON has no tuples, lists are accepted)
+    lengthError = f"expected {len(items)} items"
+    def check(value):
+        if type(value) not in (list, tuple):
+            return "expected list"
+        if len(value) != len(items):
+            return lengthError
+        for index in range(len(items)):
+            error = items[index](value[index])
+            if error:
+                return f"item {index}: {error}"
+        return None
+    return check
+
+def AnyOf(*alternatives):
+    def check(value):
+        errors = []
+        for alternative in alternatives:
+            error = alternative(value)
+            if error is None:
+                return None
+            if error not in errors:
+                errors.append(error)
+        return " or ".join(errors)
+    return check
+
+def Check(spec, function, message):
+    # spec first, then a custom test of the value
+    def check(value):
+        error = spec(value)
+        if error:
+            return error
+        return None if function(value) else message
+    return check
+
+def Any():
+    def check(value):
+        return None
+    return check
+
+
+class Schema:
+    """
+    Field specs plus cross-field rules, rules are (function(values) -> bool, field, message) and are checked
+    only when every field is valid on its own. validate() returns {field: error message}, empty if valid.
+    """
+    def __init__(self, fields: dict, rules=()):
+        self.fields = fields
+        self.checks = tuple(fields.items())
+        self.rules = tuple(rules)
+
+    @staticmethod
+    def fromDefaults(defaults: dict):
+        # type-only schema, for configs without a declared one
+        specs = {bool: Bool, int: Int, float: Float, str: Str}
+        return Schema({key: specs.get(type(value), Any)() for key, value in defaults.items()})
+
+    def validate(self, values):
+        if type(values) != dict:
+            return {'': "expected object"}
+        errors = {}
+        for key, check in self.checks:
+            if key not in values:
+                errors[key] = "missing"
+                continue
+            error = check(values[key])
+            if error:
+                errors[key] = error
+        for key in values:
+            if key not in self.fields:
+                errors[key] = "unknown field"
+        if not errors:
+            for rule, key, message in self.rules:
+                if not rule(values):
+                    errors[key] = message
+        return errors
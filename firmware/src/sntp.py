@@ -0,0 +1,182 @@
+import asyncio
+import socket
+import struct
+import time
+try:
+    from scheduler import SystemClock
+except ImportError:
+    from .scheduler import SystemClock
+
+# NTP era starts at 1900, the MicroPython epoch is either 1970 (rp2) or 2000 (older ports)
+NTP_EPOCH_OFFSET = 2208988800 if time.gmtime(0)[0] == 1970 else 3155673600
+
+class SntpClient:
+    """
+    Non-blocking SNTP client. sync() queries every configured server with its own timeout, takes the answer
+    with the lowest round-trip delay and steps the RTC on a second boundary. The offset found on every sync
+    (except the first one) is the drift accumulated since the previous one, which sets the next sync period.
+
+    All absolute times are integer milliseconds (float is single precision on the device). The RTC only has
+    second resolution, so the local sub-second phase is found by waiting for its next second change.
+    Sockets are polled (uasyncio has no UDP streams), so a sync costs a few hundred short wakeups.
+    DNS lookups are blocking on MicroPython, prefer IP addresses in the server list when that matters.
+    """
+    PACKET_SIZE = 48
+    POLL_MS = 1 # the socket and the RTC are polled, this sets the precision of the offset
+    MIN_DRIFT_INTERVAL_MS = 10*60*1000 # shorter intervals can't measure drift with ms offsets
+    DRIFT_SMOOTHING = 0.5
+
+    def __init__(self, servers, rtcGet, rtcSet, utcOffsetSec=0, clock=None, port=123, timeoutMs=1000,
+                 minIntervalSec=15*60, maxIntervalSec=24*3600, maxErrorMs=500, retryIntervalSec=30):
+        self.servers = servers
+        self.rtcGet = rtcGet # () -> current RTC seconds (local time)
+        self.rtcSet = rtcSet # (seconds) -> sets RTC to local time
+        self.utcOffsetSec = utcOffsetSec
+        self.clock = clock if clock else SystemClock()
+        self.port = port
+        self.timeoutMs = timeoutMs
+        self.minIntervalSec = minIntervalSec
+        self.maxIntervalSec = maxIntervalSec
+        self.maxErrorMs = maxErrorMs
+        self.retryIntervalSec = retryIntervalSec
+
+        self.synced = False
+        self.failures = 0
+        self.lastServer = None
+        self.lastOffsetMs = None
+        self.lastDelayMs = None
+        self.driftPpm = None
+        self.lastSyncMs = None # local time at which the RTC was last set
+        self.lastStepErrorMs = 0 # how far behind the RTC was right after that, the step is a few ms late at times
+        self.requestCounter = 0
+
+    async def sync(self):
+        """
+        Returns True if the RTC was corrected, False if no server answered.
+        """
+        baseSec, baseTicks = await self.__alignToLocalSecond()
+        best = None
+        for server in self.servers:
+            try:
+                result = await self.__query(server, baseSec, baseTicks)
+            except Exception:
+                result = None
+            if result and ((best is None) or (result[1] < best[1])):
+                best = result + (server,)
+        if best is None:
+            self.failures += 1
+            return False
+
+        offsetMs, delayMs, server = best
+        localMs = self.__localMs(baseSec, baseTicks, self.clock.ticks_ms())
+        self.__updateDrift(offsetMs, localMs)
+        # the moment the RTC is actually set is the origin of the next drift measurement
+        steppedMs, stepErrorMs = await self.__stepRtc(offsetMs, baseSec, baseTicks)
+
+        self.synced = True
+        self.failures = 0
+        self.lastServer = server
+        self.lastOffsetMs = offsetMs
+        self.lastDelayMs = delayMs
+        self.lastSyncMs = steppedMs
+        self.lastStepErrorMs = stepErrorMs
+        return True
+
+    def nextSyncDelaySec(self):
+        if self.failures:
+            return min(self.retryIntervalSec * (1 << min(self.failures - 1, 10)), self.minIntervalSec)
+        if not self.synced or (self.driftPpm is None):
+            return self.minIntervalSec
+        # time until the drift alone accumulates maxErrorMs, a zero or negligible drift never does
+        if abs(self.driftPpm) * self.maxIntervalSec <= self.maxErrorMs * 1000:
+            return self.maxIntervalSec
+        seconds = int(self.maxErrorMs * 1000 / abs(self.driftPpm))
+        return max(self.minIntervalSec, seconds)
+
+    def toDict(self):
+        return {'synced': self.synced, 'server': self.lastServer, 'offsetMs': self.lastOffsetMs,
+                'delayMs': self.lastDelayMs, 'driftPpm': self.driftPpm, 'failures': self.failures,
+                'nextSyncSec': self.nextSyncDelaySec()}
+
+    async def __alignToLocalSecond(self):
+        # the moment the RTC second changes gives the sub-second phase of the local time
+        start = self.rtcGet()
+        deadline = self.clock.ticks_add(self.clock.ticks_ms(), 1100)
+        while (self.rtcGet() == start) and (self.clock.ticks_diff(deadline, self.clock.ticks_ms()) > 0):
+            await self.clock.sleep_ms(SntpClient.POLL_MS)
+        return self.rtcGet(), self.clock.ticks_ms()
+
+    def __localMs(self, baseSec, baseTicks, ticks):
+        return baseSec * 1000 + self.clock.ticks_diff(ticks, baseTicks)
+
+    def __ntpToLocalMs(self, packet, offset):
+        seconds, fraction = struct.unpack_from('!II', packet, offset)
+        return (seconds - NTP_EPOCH_OFFSET + self.utcOffsetSec) * 1000 + ((fraction * 1000) >> 32)
+
+    async def __query(self, server, baseSec, baseTicks):
+        # returns (offsetMs, delayMs) or None
+        address = socket.getaddrinfo(server, self.port)[0][-1]
+        self.requestCounter = (self.requestCounter + 1) & 0xFFFFFFFF
+        request = bytearray(SntpClient.PACKET_SIZE)
+        request[0] = 0x1B # LI = 0, version 3, mode 3 (client)
+        # transmit timestamp is only used as a nonce, the server echoes it as the originate timestamp
+        nonce = struct.pack('!II', self.requestCounter, self.clock.ticks_ms() & 0xFFFFFFFF)
+        request[40:48] = nonce
+
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            sock.setblocking(False)
+            t1 = self.clock.ticks_ms()
+            sock.sendto(request, address)
+            while True:
+                try:
+                    response = sock.recv(SntpClient.PACKET_SIZE)
+                except OSError:
+                    if self.clock.ticks_diff(self.clock.ticks_ms(), t1) >= self.timeoutMs:
+                        return None
+                    await self.clock.sleep_ms(SntpClient.POLL_MS)
+                    continue
+                t4 = self.clock.ticks_ms()
+                # stale answer from an earlier request, or not a valid server reply: keep waiting
+                if (len(response) >= SntpClient.PACKET_SIZE) and (response[24:32] == nonce):
+                    break
+        finally:
+            sock.close()
+
+        mode, stratum = response[0] & 0x07, response[1]
+        if (mode != 4) or (stratum == 0) or ((response[0] >> 6) == 3): # not a server, kiss-o'-death or unsynchronized
+            return None
+        receiveMs = self.__ntpToLocalMs(response, 32)
+        transmitMs = self.__ntpToLocalMs(response, 40)
+        sendMs = self.__localMs(baseSec, baseTicks, t1)
+        arriveMs = self.__localMs(baseSec, baseTicks, t4)
+        offsetMs = ((receiveMs - sendMs) + (transmitMs - arriveMs)) // 2
+        delayMs = (arriveMs - sendMs) - (transmitMs - receiveMs)
+        return offsetMs, max(0, delayMs)
+
+    def __updateDrift(self, offsetMs, localMs):
+        if self.lastSyncMs is None:
+            return
+        elapsedMs = localMs - self.lastSyncMs
+        if elapsedMs < SntpClient.MIN_DRIFT_INTERVAL_MS:
+            return
+        # positive drift = RTC running fast (the server is behind it), the error left by the last step isn't drift.
+        # ppm of the server time, which passed elapsedMs + driftMs
+        driftMs = offsetMs - self.lastStepErrorMs
+        drift = -driftMs * 1000000 / (elapsedMs + driftMs)
+        if self.driftPpm is None:
+            self.driftPpm = drift
+        else:
+            self.driftPpm += SntpClient.DRIFT_SMOOTHING * (drift - self.driftPpm)
+
+    async def __stepRtc(self, offsetMs, baseSec, baseTicks):
+        # sets the RTC exactly on the next second boundary of the corrected time,
+        # the last few ms are waited with zero sleeps since sleeps tend to overshoot
+        nowMs = self.__localMs(baseSec, baseTicks, self.clock.ticks_ms()) + offsetMs
+        targetMs = nowMs + 1000 - (nowMs % 1000)
+        await self.clock.sleep_ms(max(0, targetMs - nowMs - 10))
+        while self.__localMs(baseSec, baseTicks, self.clock.ticks_ms()) + offsetMs < targetMs:
+            await self.clock.sleep_ms(0)
+        self.rtcSet(targetMs // 1000)
+        # (RTC time it was set to, ms of corrected time it was set late by)
+        return targetMs, self.__localMs(baseSec, baseTicks, self.clock.ticks_ms()) + offsetMs - targetMs
@@ -0,0 +1,48 @@
+try:
+    import ujson as json
+except:
+    import json
+
+# Device status snapshot served at /status. Every field is updated by the task that owns the data,
+# so a request only serializes the latest values (and only if anything changed since the last one).
+
+_values = {
+    'uptime': 0,
+    'time': None,
+    'timeSynced': False,
+    'ntp': None,
+    'wateringCount': 0,
+    'lastTriggerUptime': 0,
+    'status': 0,
+    'statusName': 'idle',
+    'controller': None,
+    'wifiIp': None,
+    'apIp': None,
+    'wifi': None,
+    'rssi': None,
+    'console': None,
+}
+_serialized = None
+
+def setField(key: str, value):
+    global _serialized
+    if _values.get(key) != value:
+        _values[key] = value
+        _serialized = None
+
+def updateFields(values: dict):
+    for key in values:
+        setField(key, values[key])
+
+def getField(key: str):
+    return _values.get(key)
+
+def snapshotJson():
+    global _serialized
+    if _serialized is None:
+        _serialized = json.dumps(_values)
+    return _serialized
+
+def consoleLine(dateTimeStr: str, wifiStr: str, apStr: str, uptime: int, lastTriggerUptime: int, wateringCount: int):
+    # periodic status line of the main loop
+    return f"[{dateTimeStr[-8:]}][{wifiStr}|{apStr}] Uptime: {uptime:05}   Last watering: {lastTriggerUptime:05}   Watering counter: {wateringCount:03}"
@@ -1,7 +1,12 @@
 from config import *
 import mytime
+import status as deviceStatus
+import events
+import jobs
+import loopmonitor
 from microdot import Microdot, Response
 import asyncio
+import time
 
 WEB_PORT = 80
 
@@ -12,48 +17,78 @@ _triggerCallback = None
 _controlConfig = None
 _hwConfig = None
 _wifiConfig = None
+_telemetry = None
+_wifi = None
 _console = None
+# connection tasks are created by the server, so requests are timed from routing to the response instead
+_requestTimes = loopmonitor.taskHistogram('http')
+
+@server.before_request
+async def start_request_timer(request):
+    request.g.startTicks = time.ticks_us()
+
+
+@server.after_request
+async def record_request_time(request, response):
+    _requestTimes.record(time.ticks_diff(time.ticks_us(), request.g.startTicks))
+
+
+def cached_config_response(request, config: JsonConfig):
+    # body is serialized only when the config changes, unchanged configs are revalidated with 304
+    headers = {'ETag': config.etag}
+    if request.headers.get('If-None-Match') == config.etag:
+        return '', 304, headers
+    return config.serialized, 200, headers
+
+
+def queue_config_update(config: JsonConfig, values):
+    # validation is answered right away (with an error for every invalid field), the flash write runs as a background job
+    if not config:
+        return {'error': 'No config provided'}, 400
+    errors = config.validate(values)
+    if errors:
+        return {'error': 'Invalid values', 'fields': errors}, 400
+
+    def write(job):
+        if not config.update(values):
+            raise Exception('Update failed, check logs')
+        return 'Updated'
+
+    job = jobs.submit(f"update {config.filePath}", write)
+    return {'status': 'Queued', 'job': job.id}, 202
+
 
 @server.route('/controlConfig', methods=['GET', 'POST'])
 async def handle_control_config(request):
     if request.method == 'GET':
         if _controlConfig:
-            return _controlConfig.values
+            return cached_config_response(request, _controlConfig)
         else:
             return {'error': 'No config provided'}        
     elif request.method == 'POST':
-        if _controlConfig and _controlConfig.update(request.json):
-            return {'status': 'Updated'}
-        return {'error': 'check logs'}, 400
+        return queue_config_update(_controlConfig, request.json)
 
 
 @server.route('/hwConfig', methods=['GET', 'POST'])
 async def handle_hw_config(request):
     if request.method == 'GET':
         if _hwConfig:
-            return _hwConfig.values
+            return cached_config_response(request, _hwConfig)
         else:
             return {'error': 'No config provided'}        
     elif request.method == 'POST':
-        if _hwConfig and _hwConfig.update(request.json):
-            return {'status': 'Updated'}
-        return {'error': 'check logs'}, 400
+        return queue_config_update(_hwConfig, request.json)
 
 
 @server.route('/wifiConfig', methods=['GET', 'POST'])
 async def handle_wifi_config(request):
     if request.method == 'GET':
         if _wifiConfig:
-            values = _wifiConfig.values.copy()
-            values['password'] = "___"
-            values['ap_password'] = "___"
-            return values
+            return cached_config_response(request, _wifiConfig)
         else:
             return {'error': 'No config provided'}        
     elif request.method == 'POST':
-        if _wifiConfig and _wifiConfig.update(request.json):
-            return {'status': 'Updated'}
-        return {'error': 'check logs'}, 400
+        return queue_config_update(_wifiConfig, request.json)
 
 
 @server.route('/trigger', methods=['GET'])
@@ -79,22 +114,120 @@ async def handle_time(request):
 
 @server.route('/ntpsync', methods=['GET'])
 async def handle_ntp_sync(request):
+    async def sync(job):
+        if not await mytime.syncNtp():
+            raise Exception('No NTP server answered')
+        deviceStatus.updateFields({'timeSynced': mytime.isTimeSynced(), 'ntp': mytime.sntpClient.toDict()})
+        return mytime.sntpClient.toDict()
+
+    job = jobs.submit('ntp sync', sync, timeoutSec=15)
+    return {'status': 'Queued', 'job': job.id}, 202
+
+
+@server.route('/jobs/<int:jobId>', methods=['GET'])
+async def handle_job(request, jobId):
+    job = jobs.get(jobId)
+    if not job:
+        return {'error': 'No such job'}, 404
+    return job.toDict()
+
+
+@server.route('/status', methods=['GET'])
+async def handle_status(request):
+    # snapshot is kept up to date by the tasks owning the data, nothing is collected here
+    return deviceStatus.snapshotJson()
+
+
+class EventStream:
+    """
+    Body of the /events response. microdot awaits every write to the socket before asking for the next chunk,
+    so events are taken from the subscriber queue only as fast as the client reads them, and the ones it can't
+    keep up with are dropped (and counted) by the bounded queue. The subscription is taken with the first chunk,
+    once the response is being written, and released in aclose().
+    """
+    KEEPALIVE_SEC = 30
+
+    def __init__(self, types):
+        self.types = types
+        self.subscriber = None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.subscriber is None:
+            self.subscriber = events.subscribe(self.types)
+            if self.subscriber is None:
+                raise StopAsyncIteration # the last slot was taken in the meantime
+        subscriber = self.subscriber
+        while not subscriber.queue:
+            subscriber.ready.clear()
+            try:
+                await asyncio.wait_for(subscriber.ready.wait(), EventStream.KEEPALIVE_SEC)
+            except asyncio.TimeoutError:
+                return b'event: ping\ndata: {}\n\n' # also detects clients that went away
+        eventType, data = subscriber.queue.pop(0)
+        return f"event: {eventType}\ndata: {data}\n\n".encode()
+
+    async def aclose(self):
+        if self.subscriber:
+            events.unsubscribe(self.subscriber)
+            self.subscriber = None
+
+
+@server.route('/events', methods=['GET'])
+async def handle_events(request):
+    # Server-Sent Events stream, ?types=status,controller,trigger to filter
+    if events.isFull():
+        return {'error': 'Too many subscribers'}, 503
+    types = request.args.get('types')
+    return EventStream(types.split(',') if types else None), 200, {'Content-Type': 'text/event-stream'}
+
+
+@server.route('/telemetry', methods=['GET'])
+async def handle_telemetry(request):
+    # ?start=<timestamp>&end=<timestamp>&points=<buckets>, streamed in chunks
     try:
-        mytime.syncNtp()
-        return {'status': 'Time synchronized'}
+        if not _telemetry:
+            return {'error': 'No telemetry provided'}
+        start = request.args.get('start')
+        end = request.args.get('end')
+        points = int(request.args.get('points', 200))
+        return _telemetry.iterJson(int(start) if start else None, int(end) if end else None, points)
     except Exception as e:
         return {'error': str(e)}, 400
 
 
+@server.route('/wifi/scan', methods=['GET'])
+async def handle_wifi_scan(request):
+    # cached scan results, ?refresh=1 starts a new scan (poll again for its results), deferred while watering
+    if not _wifi:
+        return {'error': 'No wifi provided'}
+    networks = _wifi.GetScanResults(refresh=request.args.get('refresh') == '1')
+    return {'ageMs': _wifi.ScanAge(), 'scanning': _wifi.scanning, 'deferred': _wifi.scanDeferred,
+            'rssi': _wifi.GetRssi(), 'networks': networks}
+
+
+@server.route('/debug/loop', methods=['GET'])
+async def handle_debug_loop(request):
+    # scheduling lag and time per resume of the tracked tasks, ?reset=1 clears them after the snapshot
+    snapshot = loopmonitor.toDict()
+    if request.args.get('reset') == '1':
+        loopmonitor.reset()
+    return snapshot
+
+
 @server.route('/')
 async def index(request):
-    return 'Auto watering system'
+    return 'Auto watering system', 200, {'Content-Type': 'text/plain'}
     
-def start(triggerCallback, controlConfig: ControlConfig, hwConfig: HwConfig, wifiConfig: WifiConfig, console):
-    global _triggerCallback, _controlConfig, _hwConfig, _wifiConfig, _console
+def start(triggerCallback, controlConfig: ControlConfig, hwConfig: HwConfig, wifiConfig: WifiConfig, telemetry, wifi, console):
+    global _triggerCallback, _controlConfig, _hwConfig, _wifiConfig, _telemetry, _wifi, _console
     _triggerCallback = triggerCallback
     _controlConfig = controlConfig
     _hwConfig = hwConfig
     _wifiConfig = wifiConfig
+    _telemetry = telemetry
+    _wifi = wifi
     _console = console
-    asyncio.create_task(server.start_server(port=WEB_PORT))
\ No newline at end of file
+    asyncio.create_task(loopmonitor.track('webserver', server.start_server(port=WEB_PORT)))
\ No newline at end of file
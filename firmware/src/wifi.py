@@ -1,12 +1,26 @@
 import uasyncio as asyncio
 import network
+import time
+import loopmonitor
 
 class Wifi():
-    def __init__(self, console):
+    SCAN_TTL_MS = 60000
+    SCAN_DEFER_POLL_MS = 500
+
+    def __init__(self, console, scanTtlMs=SCAN_TTL_MS, busyCheck=None):
         self.console = console
         self.wlan = network.WLAN(network.STA_IF)
         self.ap = network.WLAN(network.AP_IF)
 
+        # scan results cache, refreshed in the background when older than scanTtlMs
+        self.scanTtlMs = scanTtlMs
+        self.scanResults = []
+        self.scanTicks = None
+        self.scanning = False
+        # () -> True while scans have to wait, the blocking scan would delay everything else (e.g. pump cutoffs)
+        self.busyCheck = busyCheck
+        self.scanDeferred = False
+
     async def Connect(self, ssid, password, timeout_ms=15000):
         self.console.write(f'Connecting to WiFi ({ssid})...')
         if (not ssid) or (not password):
@@ -28,6 +42,15 @@ class Wifi():
         self.console.write(f'Connected. IP: {ip}')
         return ip
     
+    def BeginConnect(self, ssid, password):
+        # starts connecting and returns right away, a running access point is kept
+        self.wlan.active(True)
+        self.wlan.connect(ssid, password)
+
+    def Status(self):
+        # network.STAT_* value, negative ones are failures (wrong password, no AP found, connect fail)
+        return self.wlan.status()
+
     def Disconnect(self):
         self.console.write('Disconnecting from WiFi...')
         self.wlan.disconnect()
@@ -42,24 +65,69 @@ class Wifi():
         return self.wlan.ifconfig()[0]
 
     def Scan(self, printResults = False):
-        self.ApStop()
+        # blocks for the scan duration (a few seconds), a running access point is kept
         self.wlan.active(True)
         wifis = self.wlan.scan()
+        self.scanResults = [{'ssid': wifi[0].decode('utf-8'), 'channel': wifi[2], 'rssi': wifi[3],
+                             'security': wifi[4], 'hidden': bool(wifi[5])} for wifi in wifis]
+        self.scanTicks = time.ticks_ms()
         if printResults:
-            for wifi in wifis:
-                self.console.write(f"RSSI: {wifi[3]:04}   Channel: {wifi[2]:02}   SSID: {wifi[0].decode('utf-8')}")
+            for wifi in self.scanResults:
+                self.console.write(f"RSSI: {wifi['rssi']:04}   Channel: {wifi['channel']:02}   SSID: {wifi['ssid']}")
         return wifis
 
+    def ScanAge(self):
+        # ms since the cached results were taken, None if never
+        return time.ticks_diff(time.ticks_ms(), self.scanTicks) if self.scanTicks is not None else None
+
+    def GetScanResults(self, refresh=False):
+        # returns the cached results right away and starts a background scan if they are stale
+        age = self.ScanAge()
+        if refresh or (age is None) or (age >= self.scanTtlMs):
+            self.StartScan()
+        return self.scanResults
+
+    def StartScan(self):
+        if not self.scanning:
+            self.scanning = True
+            asyncio.create_task(loopmonitor.track('wifi scan', self.__scanTask()))
+
+    async def __scanTask(self):
+        try:
+            await asyncio.sleep_ms(0) # lets the request that asked for it complete first
+            while self.busyCheck and self.busyCheck():
+                self.scanDeferred = True
+                await asyncio.sleep_ms(Wifi.SCAN_DEFER_POLL_MS)
+            self.scanDeferred = False
+            self.Scan(False)
+        except Exception as e:
+            self.console.write(f"Error while scanning: {str(e)}")
+        finally:
+            self.scanning = False
+            self.scanDeferred = False
+
+    def GetRssi(self):
+        # RSSI of the connected network without scanning, None if not connected or not supported by the port
+        if not self.IsConnected():
+            return None
+        try:
+            return self.wlan.status('rssi')
+        except Exception:
+            return None
+
     def ReadRssi(self, ssid):
-        wifis = self.Scan(False)
-        for wifi in wifis:
-            _ssid = wifi[0].decode('utf-8')
-            if (ssid == _ssid):
-                return wifi[3]
+        if self.IsConnected() and (self.wlan.config('ssid') == ssid):
+            rssi = self.GetRssi()
+            if rssi is not None:
+                return rssi
+        for wifi in self.GetScanResults():
+            if (ssid == wifi['ssid']):
+                return wifi['rssi']
         return None
 
-    async def ApStart(self, ssid, password):
-        self.Stop()
+    async def ApStart(self, ssid, password, keepSta=False):
+        if not keepSta:
+            self.Stop()
         self.ap.active(True)
         self.ap.config(essid=ssid, password=password)
         await asyncio.sleep_ms(1000)
@@ -0,0 +1,174 @@
+# Vectorized counterpart of WateringController.run_single_iteration, stepping many configurations at once.
+# Run from root directory as (verifies batch results against the reference controller):
+# python -m helpers.batch_simulation
+
+import numpy as np
+
+from firmware.src.WateringController import WateringController
+from firmware.src.WateringSchedule import WateringSchedule
+
+SECONDS_IN_DAY = WateringController.SECONDS_IN_DAY
+
+
+def make_time_axis(start_timestamp, end_timestamp, seconds_per_step):
+    # inclusive on both ends, same as the while loop in watering_simulation.simulate()
+    return np.arange(int(start_timestamp), int(end_timestamp) + 1, int(seconds_per_step), dtype=np.int64)
+
+
+def window_mask(timestamps, watering_windows):
+    # vectorized WateringSchedule.is_open()
+    schedule = WateringSchedule(watering_windows)
+    starts, stops = np.array(schedule.starts, dtype=np.int64), np.array(schedule.stops, dtype=np.int64)
+    week_seconds = schedule.week_seconds(timestamps)
+    index = np.searchsorted(starts, week_seconds, side='right') - 1
+    return (index >= 0) & (week_seconds <= stops[np.maximum(index, 0)]) if len(starts) else np.zeros(len(timestamps), dtype=bool)
+
+
+def simulate_batch(timestamps, watering_windows, liters_per_event, setpoint, kp, ki, kd, kimax, kidec, deadtime_sec, time_window_days):
+    """
+    Simulates len(setpoint) controllers over a shared time axis (int seconds, ascending).
+    All controller params are broadcast to a common 1-D shape, so scalars can be mixed with arrays.
+    Float operations are done in the same order as in WateringController, so the results are bit-exact.
+    Returns (should_water, avg_flow, control, p, i, d), each of shape (steps, configs).
+    """
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    (liters_per_event, setpoint, kp, ki, kd, kimax, kidec, deadtime_sec, time_window_days) = \
+        (np.asarray(a, dtype=np.float64) for a in np.broadcast_arrays(
+            np.atleast_1d(liters_per_event), setpoint, kp, ki, kd, kimax, kidec, deadtime_sec, time_window_days))
+    configs = setpoint.shape[0]
+    steps = timestamps.shape[0]
+    rows = np.arange(configs)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        integral_max = (kimax * liters_per_event) / ki
+    integral_dec = kidec * integral_max
+    window_seconds = time_window_days * SECONDS_IN_DAY
+    in_window = window_mask(timestamps, watering_windows)
+
+    # pid state
+    integral_error = np.zeros(configs)
+    last_error = np.zeros(configs)
+    last_event_time = np.zeros(configs)
+
+    # per-config event logs: events[c, head[c]:tail[c]] holds the events within the time window,
+    # next_expiry[c] caches events[c, head[c]] (inf when empty) so trimming costs a single comparison per step
+    capacity = 64
+    events = np.zeros((configs, capacity), dtype=np.int64)
+    head = np.zeros(configs, dtype=np.int64)
+    tail = np.zeros(configs, dtype=np.int64)
+    next_expiry = np.full(configs, np.inf)
+    current_average = np.zeros(configs)
+
+    out_water = np.zeros((steps, configs), dtype=bool)
+    out_avg = np.zeros((steps, configs))
+    out_control = np.zeros((steps, configs))
+    out_p = np.zeros((steps, configs))
+    out_i = np.zeros((steps, configs))
+    out_d = np.zeros((steps, configs))
+    error = np.zeros(configs)
+    derivative = np.zeros(configs)
+    cutoff = np.zeros(configs)
+
+    for n in range(steps):
+        t = timestamps[n]
+
+        # trim old events, cutoff truncated like int() in the reference
+        np.subtract(t, window_seconds, out=cutoff)
+        np.trunc(cutoff, out=cutoff)
+        expired = next_expiry <= cutoff
+        if expired.any():
+            while expired.any():
+                head += expired
+                next_expiry[expired] = np.where(head[expired] < tail[expired],
+                                                events[rows[expired], np.minimum(head[expired], capacity - 1)], np.inf)
+                expired = next_expiry <= cutoff
+            current_average = ((tail - head) * liters_per_event) / time_window_days
+
+        # pid update, same operation order as WateringController.__pid_update
+        np.subtract(setpoint, current_average, out=error)
+        integral_error += error
+        np.minimum(integral_error, integral_max, out=integral_error)
+        np.maximum(integral_error, -integral_max, out=integral_error)
+        np.subtract(error, last_error, out=derivative)
+        last_error, error = error, last_error
+        p = np.multiply(kp, last_error, out=out_p[n])
+        i = np.multiply(ki, integral_error, out=out_i[n])
+        d = np.multiply(kd, derivative, out=out_d[n])
+        control = np.add(p, i, out=out_control[n])
+        control += d
+        out_avg[n] = current_average
+
+        if not in_window[n]:
+            continue
+        should_water = (t - last_event_time >= deadtime_sec) & (control >= liters_per_event)
+        if should_water.any():
+            if tail.max() >= capacity:
+                # compact the logs to the front, grow only if the live part doesn't fit
+                live = tail - head
+                capacity = max(capacity, 2 * int(live.max()) + 1)
+                compacted = np.zeros((configs, capacity), dtype=np.int64)
+                for c in range(configs):
+                    compacted[c, :live[c]] = events[c, head[c]:tail[c]]
+                events, head, tail = compacted, np.zeros(configs, dtype=np.int64), live
+            watering = rows[should_water]
+            events[watering, tail[watering]] = t
+            next_expiry[watering] = np.where(head[watering] == tail[watering], t, next_expiry[watering])
+            tail[watering] += 1
+            last_event_time[watering] = t
+            integral_error[watering] -= integral_dec[watering]
+            current_average = ((tail - head) * liters_per_event) / time_window_days
+            out_water[n] = should_water
+
+    return out_water, out_avg, out_control, out_p, out_i, out_d
+
+
+def simulate_reference(timestamps, watering_windows, liters_per_event, params):
+    controller = WateringController(**params, liters_per_event=liters_per_event, watering_windows=watering_windows)
+    should_water, avg_flow, control = [], [], []
+    for t in timestamps:
+        water, (current_average, ctrl, _) = controller.run_single_iteration(int(t))
+        should_water.append(water)
+        avg_flow.append(current_average)
+        control.append(ctrl)
+    return np.array(should_water), np.array(avg_flow), np.array(control)
+
+
+def verify_against_reference(params_list, watering_windows, liters_per_event, timestamps):
+    """
+    Runs every config through both the batch engine and WateringController, returns list of mismatching config indexes.
+    """
+    columns = {key: [p[key] for p in params_list] for key in params_list[0]}
+    should_water, avg_flow, control, _, _, _ = simulate_batch(timestamps, watering_windows, liters_per_event, **columns)
+    mismatches = []
+    for c, params in enumerate(params_list):
+        ref_water, ref_avg, ref_control = simulate_reference(timestamps, watering_windows, liters_per_event, params)
+        if not (np.array_equal(ref_water, should_water[:, c])
+                and np.array_equal(ref_avg, avg_flow[:, c])
+                and np.array_equal(ref_control, control[:, c])):
+            mismatches.append(c)
+    return mismatches
+
+
+if __name__ == "__main__":
+    import time
+
+    LITERS_PER_WATERING = 4.0
+    WATERING_WINDOWS = [(9 * 3600, 9 * 3600 + 15 * 60), (19 * 3600, 21 * 3600)]
+    SIM_DAYS = 20
+    START = 1735689600 # 2025-01-01 00:00 UTC
+
+    params_list = []
+    for setpoint in range(1, 15):
+        for kp, ki, kd, kimax, kidec, deadtime, days in [(1, 0.001, 0, 1, 0.1, 10*60, 1),
+                                                          (0.5, 0.001, 0, 1.2, 0.2, 10*60, 1.3),
+                                                          (0.6, 0.003, 0.5, 1.0, 0.3, 30*60, 1.2)]:
+            params_list.append({'setpoint': setpoint, 'kp': kp, 'ki': ki, 'kd': kd, 'kimax': kimax, 'kidec': kidec,
+                                'deadtime_sec': deadtime, 'time_window_days': days})
+
+    timestamps = make_time_axis(START, START + SIM_DAYS * SECONDS_IN_DAY, 60)
+    t0 = time.perf_counter()
+    mismatches = verify_against_reference(params_list, WATERING_WINDOWS, LITERS_PER_WATERING, timestamps)
+    print(f"Verified {len(params_list)} configs over {SIM_DAYS} days in {time.perf_counter() - t0:.1f}s")
+    if mismatches:
+        raise SystemExit(f"Batch results differ from WateringController for configs: {mismatches}")
+    print("Batch engine matches WateringController")
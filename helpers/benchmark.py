@@ -0,0 +1,346 @@
+# Benchmarks of the firmware hot paths, time and allocated bytes per call: the controller iteration (float and
+# fixed-point) at several event log sizes, JsonConfig precheck/load/update, mytime.getCurrentDateTimeStr, the status
+# console line and the microdot routes (through Microdot.handle_request on an in-memory connection, so without sockets;
+# /ntpsync and /events are left out, one goes to the network and the other never ends).
+# The results are written as JSON and compared with a stored baseline, the run fails (exit code 1) if a metric
+# got slower or allocates more than the thresholds of the baseline allow. Times depend on the machine:
+# regenerate the baseline with --update-baseline on the machine that runs the comparison.
+# CPython boxes every int above 256, so its allocations overstate the fixed-point controller, that one needs the
+# device numbers.
+# Run from root directory as:
+# python -m helpers.benchmark
+# python -m helpers.benchmark --update-baseline
+# On the device (after uploading the firmware), the results are printed as JSON and can be compared on the host:
+# mpremote run helpers/benchmark.py > device_results.json
+# python -m helpers.benchmark --compare device_results.json --baseline helpers/benchmark_baseline_device.json
+
+import gc, os, sys, time
+try:
+    import ujson as json
+except ImportError:
+    import json
+
+MICROPYTHON = sys.implementation.name == 'micropython'
+if MICROPYTHON:
+    tracemalloc = None # gc.mem_alloc() is used instead
+else:
+    import tracemalloc
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__)) if not MICROPYTHON else '.'
+DEFAULT_OUTPUT = f"{CURRENT_DIR}/outputs/benchmark_results.json"
+DEFAULT_BASELINE = f"{CURRENT_DIR}/benchmark_baseline.json"
+# a metric regresses when it exceeds baseline * ratio + slack, per-metric values in the baseline take precedence.
+# Timing on a desktop is noisy, so the time limit is loose; allocations are repeatable and checked tightly.
+DEFAULT_THRESHOLDS = {'time_ratio': 2.0, 'time_slack_us': 2.0, 'alloc_ratio': 1.1, 'alloc_slack_bytes': 64}
+
+START = 1748750400 # 2025-06-01 04:00 UTC
+SECONDS_PER_STEP = 60
+EVENT_LOG_SIZES = (0, 16, 128, 1024)
+TELEMETRY_SAMPLES = 3 * 24 * 60 # same as Logic.TELEMETRY_CAPACITY
+CONTROLLER_PARAMS = {'setpoint': 4.0, 'liters_per_event': 3.5, 'deadtime_sec': 10*60,
+                     'watering_windows': [(9 * 3600, 9 * 3600 + 15 * 60), (19 * 3600, 21 * 3600)],
+                     'time_window_days': 30.0, 'kp': 1.0, 'ki': 0.001, 'kd': 0.0, 'kimax': 1.0, 'kidec': 0.1}
+
+
+class QuietConsole:
+    def write(self, buf, level=1):
+        return 0
+
+
+def _ticks_us():
+    return time.ticks_us() if MICROPYTHON else int(time.perf_counter() * 1000000)
+
+
+def _elapsed_us(start):
+    return time.ticks_diff(time.ticks_us(), start) if MICROPYTHON else _ticks_us() - start
+
+
+def measure(function, iterations, repeats=5):
+    """
+    Returns (time per call [us], bytes allocated per call) of function(i), i being the iteration index.
+    The time is the best of the repeats. Allocations are measured in a separate pass since tracing slows
+    the calls down: on CPython the peak of traced memory while running a single call, on MicroPython
+    the heap growth with the garbage collector disabled (over fewer calls, so the heap doesn't run out).
+    """
+    function(0) # warm-up
+    best_us = None
+    for _ in range(repeats):
+        gc.collect()
+        start = _ticks_us()
+        for i in range(iterations):
+            function(i)
+        elapsed = _elapsed_us(start)
+        best_us = elapsed if best_us is None else min(best_us, elapsed)
+
+    allocated = 0
+    gc.collect()
+    if tracemalloc:
+        tracemalloc.start()
+        for i in range(iterations):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            function(i)
+            allocated += tracemalloc.get_traced_memory()[1] - before
+        tracemalloc.stop()
+        alloc_iterations = iterations
+    else:
+        alloc_iterations = min(iterations, 50)
+        gc.disable()
+        before = gc.mem_alloc()
+        for i in range(alloc_iterations):
+            function(i)
+        allocated = gc.mem_alloc() - before
+        gc.enable()
+    return best_us / iterations, allocated / alloc_iterations
+
+
+def bench_controller(results):
+    from WateringController import WateringController, FixedPointWateringController
+    window_sec = int(CONTROLLER_PARAMS['time_window_days'] * WateringController.SECONDS_IN_DAY)
+    iterations = 2000
+    for prefix, controllerClass in (("controller", WateringController), ("fixed_point_controller", FixedPointWateringController)):
+        for size in EVENT_LOG_SIZES:
+            # events spread over the time window, older ones expire while the benchmark advances
+            events = [START - window_sec + (k + 1) * window_sec // (size + 1) for k in range(size)]
+            controller = controllerClass(**CONTROLLER_PARAMS, load_event_log_callback=lambda: events)
+            results[f"{prefix}.run_single_iteration[events={size}]"] = \
+                measure(lambda i: controller.run_single_iteration(START + i * SECONDS_PER_STEP), iterations)
+
+
+def bench_config(results):
+    from config import ControlConfig
+    config = ControlConfig(QuietConsole()) # works in the current directory, see run()
+    values = config.values.copy()
+    results["config.precheck"] = measure(lambda i: config.precheck(values), 500)
+    results["config.load"] = measure(lambda i: config.load(config.filePath), 200)
+    results["config.update"] = measure(lambda i: config.update(values), 50)
+
+
+def bench_formatting(results):
+    import mytime
+    import status as deviceStatus
+    results["mytime.getCurrentDateTimeStr"] = measure(lambda i: mytime.getCurrentDateTimeStr(True, True), 2000)
+    dateTimeStr = mytime.getCurrentDateTimeStr(True, True)
+    results["status.consoleLine"] = measure(
+        lambda i: deviceStatus.consoleLine(dateTimeStr, "192.168.1.10", "x", 12345 + i, 12000, 42), 2000)
+
+
+class MemoryConnection:
+    # in-memory client connection for Microdot.handle_request: reads the raw request, collects the raw response
+    def __init__(self, request):
+        self.request = request
+        self.position = 0
+        self.response = bytearray()
+
+    async def read(self, n=-1):
+        end = len(self.request) if n < 0 else self.position + n
+        data = self.request[self.position:end]
+        self.position += len(data)
+        return data
+
+    async def readexactly(self, n):
+        return await self.read(n)
+
+    async def readline(self):
+        end = self.request.find(b'\n', self.position)
+        return await self.read((len(self.request) if end < 0 else end + 1) - self.position)
+
+    async def awrite(self, data):
+        self.response.extend(data)
+
+    async def aclose(self):
+        pass
+
+    def get_extra_info(self, name):
+        return ('127.0.0.1', 1234)
+
+
+def bench_routes(results):
+    import asyncio
+    import jobs, webserver
+    from config import ControlConfig, HwConfig, WifiConfig
+    from Telemetry import ControllerTelemetry
+    from WateringController import WateringController
+    from wifi import Wifi
+
+    console = QuietConsole()
+    controlConfig = ControlConfig(console)
+    telemetry = ControllerTelemetry(TELEMETRY_SAMPLES)
+    controller = WateringController(**CONTROLLER_PARAMS)
+    for k in range(TELEMETRY_SAMPLES):
+        t = START + k * SECONDS_PER_STEP
+        watered, (average, _, pid_values) = controller.run_single_iteration(t)
+        telemetry.record(t, average, pid_values, watered)
+
+    loop = asyncio.new_event_loop()
+    if hasattr(asyncio, 'set_event_loop'): # CPython, MicroPython has a single loop
+        asyncio.set_event_loop(loop)
+    triggers = []
+
+    async def start():
+        # the listening server isn't used, it's only given a free port
+        webserver.WEB_PORT = 0
+        webserver.start(lambda: triggers.append(1), controlConfig, HwConfig(console), WifiConfig(console), telemetry,
+                        Wifi(console), console)
+    loop.run_until_complete(start())
+
+    async def drainJobs():
+        # jobs run in FIFO order, all the earlier ones are finished once this one is
+        job = jobs.submit('benchmark', lambda job: 'done')
+        while job.state in (jobs.STATE_QUEUED, jobs.STATE_RUNNING):
+            await asyncio.sleep(0.001)
+        return job.id
+
+    def request(method, path, headers, body):
+        # same path as a socket connection: request parsing, routing, the handler and writing the response
+        connection = MemoryConnection(f"{method} {path} HTTP/1.0\r\n{headers}Content-Length: {len(body)}\r\n\r\n".encode() + body)
+        loop.run_until_complete(webserver.server.handle_request(connection, connection))
+        status = int(bytes(connection.response[9:12]))
+        if status >= 400:
+            raise Exception(f"{method} {path}: {bytes(connection.response)}")
+        if method == "POST":
+            loop.run_until_complete(drainJobs()) # the config update job is part of the cost
+
+    controlValues = json.dumps(controlConfig.values).encode()
+    routes = (("GET", "/", "", b""),
+              ("GET", "/status", "", b""),
+              ("GET", "/controlConfig", "", b""),
+              ("GET", "/controlConfig (304)", f"If-None-Match: {controlConfig.etag}\r\n", b""),
+              ("POST", "/controlConfig (+ update job)", "Content-Type: application/json\r\n", controlValues),
+              ("GET", "/hwConfig", "", b""),
+              ("GET", "/wifiConfig", "", b""),
+              ("GET", "/time", "", b""),
+              ("GET", "/trigger", "", b""),
+              ("GET", "/jobs/<id>", "", b""),
+              ("GET", "/telemetry?points=200", "", b""),
+              ("GET", "/wifi/scan", "", b""),
+              ("GET", "/debug/loop", "", b""))
+    for method, name, headers, body in routes:
+        path = name.split(' ')[0]
+        if path == "/jobs/<id>":
+            path = f"/jobs/{loop.run_until_complete(drainJobs())}"
+        results[f"route {method} {name}"] = measure(lambda i: request(method, path, headers, body), 100)
+    webserver.server.shutdown()
+    loop.run_until_complete(asyncio.sleep(0.1)) # lets the server task finish
+
+
+def run():
+    results = {}
+    bench_controller(results)
+    bench_config(results)
+    bench_formatting(results)
+    bench_routes(results)
+    return {'implementation': sys.implementation.name, 'platform': sys.platform,
+            'metrics': {name: {'us': round(us, 3), 'bytes': round(allocated, 1)} for name, (us, allocated) in results.items()}}
+
+
+def compare(results, baseline):
+    """
+    Returns a list of (metric, message) regressions. Metrics missing from the results count as regressions
+    (the baseline has to be updated when a benchmark is removed), new ones are reported only.
+    """
+    thresholds = dict(DEFAULT_THRESHOLDS, **baseline.get('thresholds', {}))
+    regressions, notes = [], []
+    for name, base in baseline['metrics'].items():
+        current = results['metrics'].get(name)
+        if current is None:
+            regressions.append((name, "missing from the results"))
+            continue
+        limits = dict(thresholds, **base.get('thresholds', {}))
+        time_limit = base['us'] * limits['time_ratio'] + limits['time_slack_us']
+        alloc_limit = base['bytes'] * limits['alloc_ratio'] + limits['alloc_slack_bytes']
+        if current['us'] > time_limit:
+            regressions.append((name, f"{current['us']:.2f} us/call, baseline {base['us']:.2f} (limit {time_limit:.2f})"))
+        if current['bytes'] > alloc_limit:
+            regressions.append((name, f"{current['bytes']:.0f} B/call, baseline {base['bytes']:.0f} (limit {alloc_limit:.0f})"))
+    for name in results['metrics']:
+        if name not in baseline['metrics']:
+            notes.append((name, "not in the baseline"))
+    return regressions, notes
+
+
+def print_results(results, baseline):
+    for name, current in results['metrics'].items():
+        base = baseline['metrics'].get(name) if baseline else None
+        change = f"  ({(current['us'] / base['us'] - 1) * 100 if base['us'] else 0:+6.1f} % time)" if base else ""
+        print(f"{name:56} {current['us']:10.2f} us/call {current['bytes']:10.1f} B/call{change}")
+
+
+def run_on_device():
+    # configs are written in a separate directory, so the real ones on the flash are left alone,
+    # the firmware modules are still imported from the current one
+    sys.path.insert(0, os.getcwd())
+    try:
+        os.mkdir('bench')
+    except OSError:
+        pass
+    os.chdir('bench')
+    try:
+        results = run()
+    finally:
+        for name in os.listdir():
+            os.remove(name)
+        os.chdir('..')
+        os.rmdir('bench')
+    print(json.dumps(results))
+
+
+def main():
+    import argparse, tempfile
+    parser = argparse.ArgumentParser(description="Benchmark the firmware hot paths and compare with a baseline")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help="results file (JSON)")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--update-baseline', action='store_true', help="store the results as the new baseline")
+    parser.add_argument('--compare', default=None, metavar='RESULTS', help="compare a stored results file instead of running")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare) as f:
+            results = json.load(f)
+    else:
+        # firmware modules imported the way the device does, with the emulator's stand-ins for the hardware
+        from helpers.emulator import virtual_time
+        sys.path[:0] = [os.path.join(CURRENT_DIR, "emulator", "stubs"), os.path.join(CURRENT_DIR, "..", "firmware", "src")]
+        virtual_time.install_time_functions(virtual_time.VirtualClock(rtc_start=START))
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as directory:
+            os.chdir(directory)
+            try:
+                results = run()
+            finally:
+                os.chdir(cwd)
+        os.makedirs(os.path.dirname(args.output), exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=1)
+        print(f"Results written to {args.output}")
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    if args.update_baseline:
+        thresholds = baseline.get('thresholds', DEFAULT_THRESHOLDS) if baseline else DEFAULT_THRESHOLDS
+        with open(args.baseline, 'w') as f:
+            json.dump({'thresholds': thresholds, 'metrics': results['metrics']}, f, indent=1)
+        print(f"Baseline updated ({args.baseline})")
+        return 0
+    if baseline is None:
+        print(f"No baseline at {args.baseline}, run with --update-baseline to create one")
+        return 0
+
+    regressions, notes = compare(results, baseline)
+    for name, message in notes:
+        print(f"NOTE {name}: {message}")
+    for name, message in regressions:
+        print(f"REGRESSION {name}: {message}")
+    print(f"{len(regressions)} regression(s)")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    if MICROPYTHON:
+        run_on_device()
+    else:
+        sys.exit(main())
@@ -0,0 +1,185 @@
+"""
+Host emulator of the Pico W firmware: boots the unmodified firmware/src/main.py under CPython, with
+stand-in machine, network, micropython and uasyncio modules (helpers/emulator/stubs) and an asyncio
+loop running on virtual time. Without --speed the loop jumps from timer to timer, so days of operation
+take seconds; the pins, PWMs, RTC and Wi-Fi are emulated, NTP is answered by a loopback server and the
+web server listens on localhost (use --speed to keep it responsive for a client, e.g. --speed 60).
+
+Usage (from the repo root):
+python -m helpers.emulator --days 3
+python -m helpers.emulator --days 1 --press 36000 --press 40000:2000 --wifi-outage 7200:1800 --trace trace.csv
+python -m helpers.emulator --speed 1 --port 8080 --verbose
+"""
+import argparse
+import asyncio
+import calendar
+import contextlib
+import csv
+import os
+import random
+import runpy
+import sys
+import tempfile
+import time
+
+from helpers.emulator import virtual_time
+from helpers.emulator.loopback import start_sntp_server, redirect_hosts
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+STUBS_DIR = os.path.join(ROOT_DIR, "helpers", "emulator", "stubs")
+FIRMWARE_DIR = os.path.join(ROOT_DIR, "firmware", "src")
+DEFAULT_TRUE_START = "2025-06-01T04:00" # UTC
+BUTTON_HOLD_MS = 200
+
+
+def parse_utc(text):
+    return calendar.timegm(time.strptime(text, "%Y-%m-%dT%H:%M"))
+
+
+def parse_pair(text, default_second):
+    # "first[:second]" -> (float, float)
+    first, _, second = text.partition(':')
+    return float(first), float(second) if second else default_second
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Runs the firmware on the host with virtual time.")
+    parser.add_argument("--days", type=float, default=3, help="virtual days to run")
+    parser.add_argument("--speed", type=float, default=None, help="virtual seconds per real second (default: as fast as possible)")
+    parser.add_argument("--port", type=int, default=8080, help="web server port on localhost")
+    parser.add_argument("--flash", default=None, help="directory used as the device filesystem (default: empty temporary one)")
+    parser.add_argument("--start", default=DEFAULT_TRUE_START, help="true UTC time at boot, YYYY-MM-DDTHH:MM")
+    parser.add_argument("--rtc-drift-ppm", type=float, default=0, help="RTC drift, positive = fast")
+    parser.add_argument("--ticks-offset", type=int, default=virtual_time.TICKS_MAX - 60000,
+                        help="ticks_ms at boot, by default it wraps around a minute after boot")
+    parser.add_argument("--press", action="append", default=[], metavar="SEC[:HOLD_MS]",
+                        help="button press at the given virtual second (repeatable)")
+    parser.add_argument("--wifi-outage", action="append", default=[], metavar="SEC:DURATION_SEC",
+                        help="router down for a while (repeatable)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed (reconnect backoff jitter)")
+    parser.add_argument("--trace", default=None, help="CSV file for the valve and pump pin changes")
+    parser.add_argument("--log", default=None, help="file for the UART console output")
+    parser.add_argument("--verbose", action="store_true", help="print the console output")
+    return parser.parse_args()
+
+
+class Emulation:
+    def __init__(self, args):
+        self.args = args
+        self.clock = virtual_time.VirtualClock(true_start=parse_utc(args.start), ticks_offset_ms=args.ticks_offset,
+                                               speed=args.speed, rtc_drift_ppm=args.rtc_drift_ppm)
+        self.sntp_server = None
+        self.loops = 0
+
+    def install(self):
+        sys.path[:0] = [STUBS_DIR, FIRMWARE_DIR]
+        virtual_time.install_time_functions(self.clock, self.on_new_loop)
+        random.seed(self.args.seed)
+        import machine, bsp, webserver
+        machine.traced_pins = (bsp.VALVE_OPEN_PIN, bsp.VALVE_CLOSE_PIN, bsp.WATER_PUMP_PIN, bsp.NUTRIENTS_PUMP_PIN)
+        webserver.WEB_PORT = self.args.port
+
+    def on_new_loop(self, loop):
+        # asyncio.run() in main.py creates the first loop, the one after it is main.py's cleanup
+        self.loops += 1
+        if self.loops > 1:
+            return
+        import mytime, network
+        self.sntp_server, port = start_sntp_server(loop, self.clock)
+        redirect_hosts(mytime.NTP_SERVERS, port)
+
+        loop.call_at(self.args.days * 86400, self.stop, loop)
+        for press in self.args.press:
+            at, hold_ms = parse_pair(press, BUTTON_HOLD_MS)
+            loop.call_at(at, self.drive_button, 0)
+            loop.call_at(at + hold_ms / 1000, self.drive_button, 1)
+        for outage in self.args.wifi_outage:
+            at, duration = parse_pair(outage, 60)
+            loop.call_at(at, setattr, network, 'router_up', False)
+            loop.call_at(at + duration, setattr, network, 'router_up', True)
+
+    def drive_button(self, value):
+        import machine, bsp
+        machine.Pin.instances[bsp.TRIGGER_BUTTON_PIN].drive(value)
+
+    def stop(self, loop):
+        for task in asyncio.all_tasks(loop):
+            task.cancel()
+
+    def run(self):
+        import machine
+        log = open(self.args.log, 'w') if self.args.log else None
+        machine.uart_sink = log
+        output = sys.stdout if self.args.verbose else open(os.devnull, 'w')
+        start = time.perf_counter()
+        try:
+            with contextlib.redirect_stdout(output):
+                runpy.run_path(os.path.join(FIRMWARE_DIR, "main.py"), run_name="__main__")
+        except (asyncio.CancelledError, KeyboardInterrupt):
+            pass
+        finally:
+            if log:
+                log.close()
+        return time.perf_counter() - start
+
+
+def watering_cycles(trace, pump_pin):
+    # (virtual start, RTC start, seconds, mean duty) of every pump run
+    cycles, started = [], None
+    for now, rtc, pin, kind, value in trace:
+        if pin != pump_pin or kind != 'duty':
+            continue
+        if value and started is None:
+            started = (now, rtc, value)
+        elif not value and started is not None:
+            cycles.append((started[0], started[1], now - started[0], started[2] / 65535))
+            started = None
+    return cycles
+
+
+def print_summary(emulation, real_sec):
+    import machine, bsp, mytime
+    clock = emulation.clock
+    print(f"{clock.now / 3600:.1f} virtual hours in {real_sec:.1f} s ({clock.now / max(real_sec, 1e-9):.0f}x), "
+          f"{clock.jumped / max(clock.now, 1e-9) * 100:.1f} % of the time skipped")
+    true_local = clock.true_seconds() + mytime.UTC_TIMEZONE_OFFSET_SECONDS
+    print(f"RTC {time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(clock.rtc_seconds()))}, "
+          f"error {(clock.rtc_seconds() - true_local) * 1000:+.0f} ms, "
+          f"{emulation.sntp_server.requests if emulation.sntp_server else 0} NTP requests")
+
+    counts = machine.edge_counts
+    print(f"valve edges: open {counts.get(bsp.VALVE_OPEN_PIN, 0)}, close {counts.get(bsp.VALVE_CLOSE_PIN, 0)}; "
+          f"LED toggles {counts.get(bsp.LED_PIN, 0)}; console {machine.uart_bytes} bytes")
+
+    cycles = watering_cycles(machine.trace, bsp.WATER_PUMP_PIN)
+    liters = sum(seconds * duty * bsp.WATER_PUMP_FLOW_ML_SEC / 1000 for _, _, seconds, duty in cycles)
+    print(f"{len(cycles)} watering cycles, {liters:.1f} l ({liters / max(clock.now / 86400, 1e-9):.2f} l/day)")
+    for now, rtc, seconds, duty in cycles:
+        print(f"  {time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(rtc))}  pump {seconds:.1f} s at {duty * 100:.0f} %")
+
+
+def write_trace(path, trace):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(('virtual_sec', 'rtc', 'pin', 'kind', 'value'))
+        for now, rtc, pin, kind, value in trace:
+            writer.writerow((f"{now:.3f}", time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(rtc)), pin, kind, value))
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    for name in ('trace', 'log'):
+        if getattr(args, name):
+            setattr(args, name, os.path.abspath(getattr(args, name)))
+    with contextlib.ExitStack() as stack:
+        flash = args.flash or stack.enter_context(tempfile.TemporaryDirectory(prefix="pico-flash-"))
+        os.makedirs(flash, exist_ok=True)
+        os.chdir(flash) # the firmware keeps its configs and stores in the working directory
+        emulation = Emulation(args)
+        emulation.install()
+        real_sec = emulation.run()
+        os.chdir(ROOT_DIR)
+    print_summary(emulation, real_sec)
+    if args.trace:
+        import machine
+        write_trace(args.trace, machine.trace)
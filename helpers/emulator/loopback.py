@@ -0,0 +1,56 @@
+"""
+Loopback services for the emulated device: an SNTP server answering with the virtual "true" UTC time
+(VirtualClock.true_seconds) and a name resolution that sends the firmware's NTP servers to it.
+"""
+import asyncio
+import socket
+import struct
+
+from firmware.src.sntp import NTP_EPOCH_OFFSET
+
+
+def ntp_timestamp(t):
+    seconds = int(t)
+    return struct.pack('!II', seconds + NTP_EPOCH_OFFSET, int((t - seconds) * (1 << 32)))
+
+
+class SntpServerProtocol(asyncio.DatagramProtocol):
+    def __init__(self, virtual_clock):
+        self.clock = virtual_clock
+        self.requests = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, request, address):
+        if len(request) < 48:
+            return
+        self.requests += 1
+        now = self.clock.true_seconds()
+        response = bytearray(48)
+        response[0] = (3 << 3) | 4 # version 3, server
+        response[1] = 2 # stratum
+        response[24:32] = request[40:48]
+        response[32:40] = ntp_timestamp(now)
+        response[40:48] = ntp_timestamp(now)
+        self.transport.sendto(response, address)
+
+
+def start_sntp_server(loop, virtual_clock):
+    # returns (protocol, port), the server starts serving once the loop runs
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(('127.0.0.1', 0))
+    protocol = SntpServerProtocol(virtual_clock)
+    loop.create_task(loop.create_datagram_endpoint(lambda: protocol, sock=sock))
+    return protocol, sock.getsockname()[1]
+
+
+def redirect_hosts(hosts, port):
+    # resolves the given host names to 127.0.0.1:port, everything else as usual
+    getaddrinfo = socket.getaddrinfo
+
+    def loopback_getaddrinfo(host, *args, **kwargs):
+        if host in hosts:
+            return [(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP, '', ('127.0.0.1', port))]
+        return getaddrinfo(host, *args, **kwargs)
+    socket.getaddrinfo = loopback_getaddrinfo
@@ -0,0 +1,156 @@
+# Stand-in for MicroPython's machine module. Pins and PWMs record every change with the virtual time
+# into the trace list, input pins can be driven with Pin.drive(), which fires the IRQ handler like the hardware.
+import asyncio
+import time
+
+from helpers.emulator import virtual_time
+
+trace = [] # (virtual seconds, RTC seconds, pin id, 'value' or 'duty', new value) of the traced pins
+traced_pins = None # pin ids to trace, None traces all of them
+edge_counts = {} # pin id -> number of changes, counted for every pin
+uart_sink = None # file-like object receiving the UART output
+uart_bytes = 0
+
+def _record(pin_id, kind, value):
+    edge_counts[pin_id] = edge_counts.get(pin_id, 0) + 1
+    if (traced_pins is None) or (pin_id in traced_pins):
+        trace.append((virtual_time.clock.now, virtual_time.clock.rtc_seconds(), pin_id, kind, value))
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+    OPEN_DRAIN = 2
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_FALLING = 4
+    IRQ_RISING = 8
+
+    instances = {} # pin id -> last created Pin, so tests can find the ones the firmware created
+
+    def __init__(self, pin_id, mode=IN, pull=None, value=None):
+        self.pin_id = pin_id
+        self.mode = mode
+        self.pull = pull
+        self.irq_handler = None
+        self.irq_trigger = 0
+        # floating inputs read 0, pulled ones follow their pull
+        self._value = 1 if pull == Pin.PULL_UP else 0
+        Pin.instances[pin_id] = self
+        if value is not None:
+            self.value(value)
+
+    def value(self, value=None):
+        if value is None:
+            return self._value
+        value = 1 if value else 0
+        if value != self._value:
+            self._value = value
+            _record(self.pin_id, 'value', value)
+
+    def on(self):
+        self.value(1)
+
+    def off(self):
+        self.value(0)
+
+    def toggle(self):
+        self.value(1 - self._value)
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING, hard=False):
+        self.irq_handler = handler
+        self.irq_trigger = trigger
+
+    def drive(self, value):
+        # external signal on an input pin (button, sensor)
+        value = 1 if value else 0
+        if value == self._value:
+            return
+        self._value = value
+        _record(self.pin_id, 'value', value)
+        edge = Pin.IRQ_RISING if value else Pin.IRQ_FALLING
+        if self.irq_handler and (self.irq_trigger & edge):
+            self.irq_handler(self)
+
+
+class PWM:
+    def __init__(self, pin, freq=None, duty_u16=None):
+        self.pin = pin
+        self._freq = freq
+        self._duty = 0
+        if duty_u16 is not None:
+            self.duty_u16(duty_u16)
+
+    def freq(self, value=None):
+        if value is None:
+            return self._freq
+        self._freq = value
+
+    def duty_u16(self, value=None):
+        if value is None:
+            return self._duty
+        if value != self._duty:
+            self._duty = value
+            _record(self.pin.pin_id, 'duty', value)
+
+    def deinit(self):
+        self.duty_u16(0)
+
+
+class UART:
+    def __init__(self, uart_id, baudrate=115200, tx=None, rx=None):
+        self.uart_id = uart_id
+
+    def init(self, *args, **kwargs):
+        pass
+
+    def write(self, data):
+        global uart_bytes
+        data = bytes(data)
+        uart_bytes += len(data)
+        if uart_sink is not None:
+            uart_sink.write(data.decode(errors='replace'))
+        return len(data)
+
+
+class Timer:
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, timer_id=-1, mode=PERIODIC, period=-1, freq=None, callback=None):
+        self.handle = None
+        if callback:
+            self.init(mode=mode, period=period, freq=freq, callback=callback)
+
+    def init(self, mode=PERIODIC, period=-1, freq=None, callback=None):
+        self.deinit()
+        self.mode = mode
+        self.period = (1 / freq) if freq else period / 1000
+        self.callback = callback
+        self.handle = asyncio.get_event_loop().call_later(self.period, self._fire)
+
+    def _fire(self):
+        if self.mode == Timer.PERIODIC:
+            self.handle = asyncio.get_event_loop().call_later(self.period, self._fire)
+        else:
+            self.handle = None
+        self.callback(self)
+
+    def deinit(self):
+        if self.handle:
+            self.handle.cancel()
+            self.handle = None
+
+
+class RTC:
+    # backed by the virtual clock, the datetime tuple is (year, month, day, weekday, hours, minutes, seconds, subseconds)
+    def datetime(self, value=None):
+        if value is None:
+            t = time.gmtime(virtual_time.clock.rtc_seconds())
+            return (t[0], t[1], t[2], t[6], t[3], t[4], t[5], 0)
+        year, month, day, _, hours, minutes, seconds = value[:7]
+        virtual_time.clock.set_rtc_seconds(time.mktime((year, month, day, hours, minutes, seconds, 0, 0, 0)))
+
+
+def reset():
+    raise SystemExit("machine.reset()")
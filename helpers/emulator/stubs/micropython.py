@@ -0,0 +1,11 @@
+# Stand-in for MicroPython's micropython module.
+import asyncio
+
+
+def schedule(function, arg):
+    # runs soon on the event loop, like a soft IRQ callback between two bytecodes
+    asyncio.get_event_loop().call_soon(function, arg)
+
+
+def const(value):
+    return value
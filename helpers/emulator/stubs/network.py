@@ -0,0 +1,77 @@
+# Stand-in for MicroPython's network module. The station "connects" to a loopback router after
+# connect_delay_sec of virtual time, as long as router_up is set and the password matches router_password
+# (None accepts any). The firmware then serves on the host's loopback interface.
+from helpers.emulator import virtual_time
+
+STA_IF = 0
+AP_IF = 1
+
+STAT_IDLE = 0
+STAT_CONNECTING = 1
+STAT_GOT_IP = 3
+STAT_CONNECT_FAIL = -1
+STAT_NO_AP_FOUND = -2
+STAT_WRONG_PASSWORD = -3
+
+router_up = True
+router_password = None
+connect_delay_sec = 2.0
+rssi = -58
+scan_results = [(b'loopback', b'\x02\x00\x00\x00\x00\x01', 6, -58, 3, 0),
+                (b'neighbour', b'\x02\x00\x00\x00\x00\x02', 11, -81, 3, 0)]
+
+
+class WLAN:
+    def __init__(self, interface):
+        self.interface = interface
+        self._active = False
+        self._config = {'ssid': '', 'essid': ''}
+        self.connect_at = None # virtual time of the connection, None if not connecting
+        self.password_ok = False
+
+    def active(self, value=None):
+        if value is None:
+            return self._active
+        self._active = bool(value)
+        if not self._active:
+            self.connect_at = None
+
+    def connect(self, ssid, password):
+        self._config['ssid'] = ssid
+        self.password_ok = (router_password is None) or (password == router_password)
+        self.connect_at = virtual_time.clock.now + connect_delay_sec
+
+    def disconnect(self):
+        self.connect_at = None
+
+    def isconnected(self):
+        return self._active and router_up and self.password_ok and (self.connect_at is not None) \
+            and (virtual_time.clock.now >= self.connect_at)
+
+    def status(self, param=None):
+        if param == 'rssi':
+            if not self.isconnected():
+                raise OSError("not connected")
+            return rssi
+        if self.connect_at is None:
+            return STAT_IDLE
+        if self.isconnected():
+            return STAT_GOT_IP
+        if virtual_time.clock.now < self.connect_at:
+            return STAT_CONNECTING
+        if not router_up:
+            return STAT_NO_AP_FOUND
+        return STAT_WRONG_PASSWORD if not self.password_ok else STAT_CONNECT_FAIL
+
+    def ifconfig(self):
+        if self.interface == AP_IF:
+            return ('127.0.0.1', '255.255.255.0', '127.0.0.1', '127.0.0.1') if self._active else ('0.0.0.0',) * 4
+        return ('127.0.0.1', '255.0.0.0', '127.0.0.1', '127.0.0.1') if self.isconnected() else ('0.0.0.0',) * 4
+
+    def config(self, *args, **kwargs):
+        if args:
+            return self._config.get(args[0])
+        self._config.update(kwargs)
+
+    def scan(self):
+        return list(scan_results)
@@ -0,0 +1,32 @@
+# Stand-in for MicroPython's (u)asyncio: CPython asyncio plus the MicroPython extras. The extras are added to the
+# asyncio module as well, since some firmware modules import it under that name.
+import asyncio
+from asyncio import *
+from asyncio import TimeoutError, Event, sleep, wait_for, create_task, run, new_event_loop, get_event_loop
+
+
+async def sleep_ms(ms):
+    await asyncio.sleep(ms / 1000)
+
+
+class ThreadSafeFlag(asyncio.Event):
+    # wait() clears the flag when it returns, like MicroPython's ThreadSafeFlag
+    async def wait(self):
+        await super().wait()
+        self.clear()
+
+
+class StreamWriter:
+    # MicroPython's StreamWriter(stream, extra) over a plain stream object (e.g. UART)
+    def __init__(self, stream, extra=None):
+        self.stream = stream
+
+    def write(self, data):
+        self.stream.write(data)
+
+    async def drain(self):
+        await asyncio.sleep(0)
+
+
+asyncio.sleep_ms = sleep_ms
+asyncio.ThreadSafeFlag = ThreadSafeFlag
@@ -0,0 +1,127 @@
+"""
+Virtual time for the emulator: an asyncio event loop whose clock jumps straight to the next timer when there's
+no I/O to wait for, so days of firmware sleeps pass in seconds. With a speed factor, the loop waits for I/O
+real_timeout = virtual_timeout / speed instead, which keeps it usable for an HTTP client driving the firmware.
+
+The same clock backs the MicroPython time functions (ticks_ms with its 2**30 wrap-around, time.time() read from
+the virtual RTC), which install_time_functions() adds to the CPython time module.
+"""
+import asyncio
+import calendar
+import selectors
+import time
+
+TICKS_PERIOD = 1 << 30 # MicroPython small int ticks
+TICKS_MAX = TICKS_PERIOD - 1
+TICKS_HALFPERIOD = TICKS_PERIOD // 2
+DEFAULT_RTC_START = calendar.timegm((2021, 1, 1, 0, 0, 0)) # unsynchronized Pico W RTC after power-up
+LOOP_PASS_SEC = 20e-6 # virtual cost of an event loop pass with ready callbacks, so that busy waits make progress
+
+clock = None # the active VirtualClock, used by the stand-in modules
+
+
+class VirtualClock:
+    def __init__(self, rtc_start=DEFAULT_RTC_START, true_start=None, ticks_offset_ms=0, speed=None, rtc_drift_ppm=0):
+        self.now = 0.0 # virtual seconds since boot
+        self.speed = speed # None = as fast as possible
+        self.ticks_offset_ms = ticks_offset_ms # start close to the wrap-around to shake out ticks bugs
+        self.rtc_rate = 1 + rtc_drift_ppm / 1000000 # positive drift = RTC running fast
+        self.rtc_base = float(rtc_start) # RTC seconds at now == 0
+        self.true_base = float(rtc_start if true_start is None else true_start) # UTC the loopback NTP server answers with
+        self.jumped = 0.0 # virtual seconds skipped without waiting
+
+    def ticks_ms(self):
+        return (int(self.now * 1000) + self.ticks_offset_ms) & TICKS_MAX
+
+    def ticks_us(self):
+        return (int(self.now * 1000000) + self.ticks_offset_ms * 1000) & TICKS_MAX
+
+    def rtc_seconds(self):
+        return self.rtc_base + self.now * self.rtc_rate
+
+    def set_rtc_seconds(self, seconds):
+        self.rtc_base = seconds - self.now * self.rtc_rate
+
+    def true_seconds(self):
+        return self.true_base + self.now
+
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) & TICKS_MAX
+
+
+def ticks_diff(ticks1, ticks2):
+    return ((ticks1 - ticks2 + TICKS_HALFPERIOD) & TICKS_MAX) - TICKS_HALFPERIOD
+
+
+class VirtualTimeSelector:
+    # wraps the real selector, I/O is always polled but timer waits are skipped (or shortened by speed)
+    def __init__(self, selector, virtual_clock):
+        self.selector = selector
+        self.clock = virtual_clock
+        self.real_anchor = None # (perf_counter, virtual time) at the first select with a speed factor
+
+    def select(self, timeout=None):
+        if self.clock.speed is None:
+            events = self.selector.select(0)
+            if events or (timeout is None) or (timeout <= 0):
+                if (timeout is None) and not events:
+                    events = self.selector.select(None) # nothing scheduled, only I/O can wake the loop
+                elif timeout is not None:
+                    self.clock.now += LOOP_PASS_SEC
+                return events
+            self.clock.now += timeout
+            self.clock.jumped += timeout
+            return events
+
+        # scaled real time, the time spent running the callbacks counts as well
+        if self.real_anchor is None:
+            self.real_anchor = (time.perf_counter(), self.clock.now)
+        events = self.selector.select(None if timeout is None else timeout / self.clock.speed)
+        real_start, virtual_start = self.real_anchor
+        self.clock.now = max(self.clock.now, virtual_start + (time.perf_counter() - real_start) * self.clock.speed)
+        return events
+
+    def __getattr__(self, name):
+        return getattr(self.selector, name)
+
+
+class VirtualTimeLoop(asyncio.SelectorEventLoop):
+    def __init__(self, virtual_clock):
+        super().__init__(VirtualTimeSelector(selectors.DefaultSelector(), virtual_clock))
+        self.virtual_clock = virtual_clock
+
+    def time(self):
+        return self.virtual_clock.now
+
+
+class VirtualTimePolicy(asyncio.DefaultEventLoopPolicy):
+    # asyncio.run() in main.py creates its loop through the policy
+    def __init__(self, virtual_clock, on_new_loop=None):
+        super().__init__()
+        self.virtual_clock = virtual_clock
+        self.on_new_loop = on_new_loop # called with every new loop, e.g. to schedule the end of the run
+
+    def new_event_loop(self):
+        loop = VirtualTimeLoop(self.virtual_clock)
+        if self.on_new_loop:
+            self.on_new_loop(loop)
+        return loop
+
+
+def install_time_functions(virtual_clock, on_new_loop=None):
+    """
+    Adds MicroPython's time functions to the CPython time module and points time.time() and time.localtime()
+    at the virtual RTC (no time zones on the Pico, localtime is UTC).
+    """
+    global clock
+    clock = virtual_clock
+    time.ticks_ms = virtual_clock.ticks_ms
+    time.ticks_us = virtual_clock.ticks_us
+    time.ticks_add = ticks_add
+    time.ticks_diff = ticks_diff
+    time.time = virtual_clock.rtc_seconds
+    gmtime = time.gmtime
+    time.localtime = lambda seconds=None: gmtime(virtual_clock.rtc_seconds() if seconds is None else seconds)
+    time.mktime = lambda t: calendar.timegm(tuple(t)[:6])
+    asyncio.set_event_loop_policy(VirtualTimePolicy(virtual_clock, on_new_loop))
@@ -0,0 +1,86 @@
+# Checks EventLogStore on real files in a temporary directory: appending only the new events, compaction once the
+# file grows past maxFileSize, and recovery from a record cut short by a power loss while appending.
+# Run from root directory as:
+# python -m helpers.event_log_store_check
+
+import os, tempfile
+
+from firmware.src.EventLogStore import EventLogStore
+
+MAX_FILE_SIZE = 64 # 16 records
+WINDOW = 5 # events kept by the "controller"
+
+
+class RecordingConsole:
+    def __init__(self):
+        self.lines = []
+
+    def write(self, buf):
+        self.lines.append(buf)
+
+
+def check(name, condition, failures):
+    if not condition:
+        failures.append(name)
+        print(f"FAILED: {name}")
+
+
+def check_append(directory, failures):
+    path = os.path.join(directory, "append.bin")
+    store = EventLogStore(path, RecordingConsole(), MAX_FILE_SIZE)
+    check("empty load", store.load() == [], failures)
+    store.store([100, 200, 300])
+    store.store([100, 200, 300, 400])
+    check("only new events appended", os.path.getsize(path) == 4 * EventLogStore.RECORD_SIZE, failures)
+    store.store([100, 200, 300, 400]) # nothing new
+    check("unchanged log not written", os.path.getsize(path) == 4 * EventLogStore.RECORD_SIZE, failures)
+    check("appended events loaded", EventLogStore(path, RecordingConsole(), MAX_FILE_SIZE).load() == [100, 200, 300, 400], failures)
+
+
+def check_compaction(directory, failures):
+    path = os.path.join(directory, "compaction.bin")
+    console = RecordingConsole()
+    store = EventLogStore(path, console, MAX_FILE_SIZE)
+    store.load()
+    events = []
+    for t in range(1, 101):
+        # sliding window of the newest events, like the trimmed controller event log
+        events = (events + [t * 60])[-WINDOW:]
+        store.store(events)
+        if os.path.getsize(path) > MAX_FILE_SIZE:
+            check(f"file size within {MAX_FILE_SIZE} bytes", False, failures)
+            break
+    check("compacted", any(line.startswith("Compacted") for line in console.lines), failures)
+    loaded = EventLogStore(path, RecordingConsole(), MAX_FILE_SIZE).load()
+    check("newest events kept by compaction", loaded[-WINDOW:] == events, failures)
+    check("loaded events sorted", loaded == sorted(loaded), failures)
+
+
+def check_truncated_tail(directory, failures):
+    path = os.path.join(directory, "truncated.bin")
+    store = EventLogStore(path, RecordingConsole(), MAX_FILE_SIZE)
+    store.load()
+    store.store([100, 200, 300])
+    with open(path, 'ab') as f:
+        f.write(b'\x90\x01') # half of a record, power lost while appending
+    with open(path + ".tmp", 'wb') as f:
+        f.write(b'\x00' * 7) # leftover of an interrupted compaction, must be ignored
+
+    console = RecordingConsole()
+    store = EventLogStore(path, console, MAX_FILE_SIZE)
+    check("complete records recovered", store.load() == [100, 200, 300], failures)
+    check("recovery reported", any(line.startswith("Truncated record") for line in console.lines), failures)
+    check("partial record removed", os.path.getsize(path) == 3 * EventLogStore.RECORD_SIZE, failures)
+    store.store([100, 200, 300, 400])
+    check("append after recovery", EventLogStore(path, RecordingConsole(), MAX_FILE_SIZE).load() == [100, 200, 300, 400], failures)
+
+
+if __name__ == "__main__":
+    failures = []
+    with tempfile.TemporaryDirectory() as directory:
+        check_append(directory, failures)
+        check_compaction(directory, failures)
+        check_truncated_tail(directory, failures)
+    if failures:
+        raise SystemExit(f"{len(failures)} checks failed")
+    print("EventLogStore: append, compaction and truncated tail recovery OK")
@@ -0,0 +1,110 @@
+# Event-skipping simulation: WateringController.run_iterations() steps one iteration at a time only when watering
+# is possible, and jumps over the rest with WateringController.advance().
+# advance() still adds the integral once per skipped step until it saturates, so its worst case is O(steps).
+# FixedPointWateringController is checked the same way, its advance() adds the integral at once.
+# Run from root directory as (verifies the results against plain stepping):
+# python -m helpers.fast_forward_simulation
+
+from firmware.src.WateringController import WateringController, FixedPointWateringController
+
+
+def simulate_event_skipping(controller: WateringController, start_timestamp, end_timestamp, seconds_per_step):
+    """
+    Returns list of watering event timestamps, for iterations at start_timestamp + k * seconds_per_step (<= end_timestamp).
+    """
+    steps = (end_timestamp - start_timestamp) // seconds_per_step + 1
+    return controller.run_iterations(start_timestamp, steps, seconds_per_step)
+
+
+def simulate_stepping(controller: WateringController, start_timestamp, end_timestamp, seconds_per_step):
+    events = []
+    t = start_timestamp
+    while t <= end_timestamp:
+        should_water, _ = controller.run_single_iteration(t)
+        if should_water:
+            events.append(t)
+        t += seconds_per_step
+    return events
+
+
+def compare_states(a: WateringController, b: WateringController):
+    # advance() must be exact, not just close
+    return (list(a.event_log) == list(b.event_log)) and (a.get_state() == b.get_state())
+
+
+if __name__ == "__main__":
+    import random, time
+
+    LITERS_PER_WATERING = 4.0
+    WATERING_WINDOWS = [(9 * 3600, 9 * 3600 + 15 * 60), (19 * 3600, 21 * 3600)]
+    SECONDS_PER_STEP = 60
+    SIM_DAYS = 50
+    START = 1735689600 # 2025-01-01 00:00 UTC
+    END = START + SIM_DAYS * WateringController.SECONDS_IN_DAY
+
+    random.seed(1)
+    params_list = []
+    for setpoint in range(1, 15):
+        for _ in range(3):
+            params_list.append({'setpoint': setpoint,
+                                'deadtime_sec': random.choice([10*60, 30*60, 60*60]),
+                                'time_window_days': random.choice([1, 1.2, 1.3, 2]),
+                                'kp': random.choice([0.5, 0.6, 1]),
+                                'ki': random.choice([0.001, 0.003]),
+                                'kd': random.choice([0, 0.5]),
+                                'kimax': random.choice([1, 1.2]),
+                                'kidec': random.choice([0.02, 0.1, 0.3])})
+
+    def make_controller(params, controller_class=WateringController):
+        return controller_class(**params, liters_per_event=LITERS_PER_WATERING, watering_windows=WATERING_WINDOWS)
+
+    failures, diverged = 0, 0
+    for controller_class in (WateringController, FixedPointWateringController):
+        stepping_time, skipping_time = 0.0, 0.0
+        for params in params_list:
+            # state after a single jump must match stepping, from random points of a warmed-up run
+            reference, jumping = make_controller(params, controller_class), make_controller(params, controller_class)
+            t = START
+            for _ in range(20):
+                while reference.get_next_watering_time(t) - t < SECONDS_PER_STEP:
+                    reference.run_single_iteration(t)
+                    jumping.run_single_iteration(t)
+                    t += SECONDS_PER_STEP
+                idle_steps = random.randint(1, int((reference.get_next_watering_time(t) - t) // SECONDS_PER_STEP))
+                for k in range(idle_steps):
+                    _, expected = reference.run_single_iteration(t + k * SECONDS_PER_STEP)
+                _, result = jumping.advance(t, idle_steps, SECONDS_PER_STEP)
+                t += idle_steps * SECONDS_PER_STEP
+                if not compare_states(reference, jumping) or (result != expected):
+                    failures += 1
+                    print(f"State mismatch after advance({idle_steps}): {params}")
+                    break
+
+            # watering events of the whole run must be the same
+            t0 = time.perf_counter()
+            expected_events = simulate_stepping(make_controller(params, controller_class), START, END, SECONDS_PER_STEP)
+            t1 = time.perf_counter()
+            events = simulate_event_skipping(make_controller(params, controller_class), START, END, SECONDS_PER_STEP)
+            t2 = time.perf_counter()
+            stepping_time += t1 - t0
+            skipping_time += t2 - t1
+            if events != expected_events:
+                diverged += 1
+                print(f"Events diverged: {params}")
+
+        print(f"{controller_class.__name__}, {len(params_list)} configs, {SIM_DAYS} days: stepping {stepping_time:.2f}s, event skipping {skipping_time:.2f}s")
+
+    # worst case of advance(): the integral never reaches its limit, so it's still added once per skipped step
+    worst = dict(params_list[0], ki=1e-9, kimax=1000)
+    print("advance() without integral saturation, O(steps) for WateringController, O(1) for FixedPointWateringController:")
+    for controller_class in (WateringController, FixedPointWateringController):
+        timings = []
+        for steps in (1000, 10000, 100000):
+            controller = make_controller(worst, controller_class)
+            t0 = time.perf_counter()
+            controller.advance(START, steps, SECONDS_PER_STEP)
+            timings.append(f"{steps} steps {(time.perf_counter() - t0) * 1000:.1f} ms")
+        print(f"  {controller_class.__name__}: {', '.join(timings)}")
+    if failures or diverged:
+        raise SystemExit(f"{failures} state mismatches, {diverged} runs with diverged events")
+    print("advance() matches single stepping")
@@ -0,0 +1,99 @@
+# Checks FixedPointWateringController against WateringController: both are stepped side by side over the same
+# minutes, the control values must stay within CONTROL_TOLERANCE while the decisions agree, and a decision may only
+# differ where the float control is within CONTROL_TOLERANCE of liters_per_event (the states diverge after that,
+# so the comparison of that config stops there). The PID state has to carry over between both in either direction.
+# Run from root directory as:
+# python -m helpers.fixed_point_check
+
+import random
+
+from firmware.src.WateringController import WateringController, FixedPointWateringController
+
+CONTROL_TOLERANCE = 0.001 # liters
+SECONDS_PER_STEP = 60
+SIM_DAYS = 30
+START = 1735689600 # 2025-01-01 00:00 UTC
+WATERING_WINDOWS = [(9 * 3600, 9 * 3600 + 15 * 60), (19 * 3600, 21 * 3600)]
+
+
+def make_controllers(params):
+    return WateringController(**params, watering_windows=WATERING_WINDOWS), \
+        FixedPointWateringController(**params, watering_windows=WATERING_WINDOWS)
+
+
+def compare_run(params):
+    """
+    Returns (max |control difference| while the decisions agree, float control at the first different decision
+    or None, number of waterings until then).
+    """
+    reference, fixed = make_controllers(params)
+    max_diff = 0.0
+    waterings = 0
+    t = START
+    for _ in range(SIM_DAYS * WateringController.SECONDS_IN_DAY // SECONDS_PER_STEP):
+        should_water, (_, control, _) = reference.run_single_iteration(t)
+        fixed_water, (_, fixed_control, _) = fixed.run_single_iteration(t)
+        if fixed_water != should_water:
+            return max_diff, control, waterings
+        max_diff = max(max_diff, abs(control - fixed_control))
+        waterings += should_water
+        t += SECONDS_PER_STEP
+    return max_diff, None, waterings
+
+
+def check_state_transfer(params, failures):
+    # the state of a warmed-up controller is taken over by the other kind, then both have to stay together
+    for source_class, target_class in ((WateringController, FixedPointWateringController),
+                                       (FixedPointWateringController, WateringController)):
+        source = source_class(**params, watering_windows=WATERING_WINDOWS)
+        t = START
+        for _ in range(3 * WateringController.SECONDS_IN_DAY // SECONDS_PER_STEP):
+            source.run_single_iteration(t)
+            t += SECONDS_PER_STEP
+        target = target_class(**params, watering_windows=WATERING_WINDOWS, load_event_log_callback=lambda: list(source.event_log))
+        target.set_state(*source.get_state())
+        integral_error, last_error, last_event_time = target.get_state()
+        source_state = source.get_state()
+        if (last_event_time != source_state[2]) or (abs(last_error - source_state[1]) > CONTROL_TOLERANCE) or \
+                (abs(integral_error - source_state[0]) * params['ki'] > CONTROL_TOLERANCE):
+            failures.append(f"{source_class.__name__} -> {target_class.__name__}: state {source_state} read back as {target.get_state()}")
+            continue
+        _, (_, source_control, _) = source.run_single_iteration(t)
+        _, (_, target_control, _) = target.run_single_iteration(t)
+        if abs(source_control - target_control) > CONTROL_TOLERANCE:
+            failures.append(f"{source_class.__name__} -> {target_class.__name__}: control {source_control} vs {target_control}")
+
+
+if __name__ == "__main__":
+    random.seed(1)
+    failures = []
+    worst_diff, diverged, configs = 0.0, 0, 0
+    for setpoint in range(1, 15):
+        for _ in range(3):
+            params = {'setpoint': setpoint,
+                      'liters_per_event': random.choice([2.5, 3.5, 4.0]),
+                      'deadtime_sec': random.choice([10*60, 30*60, 60*60]),
+                      'time_window_days': random.choice([1, 1.2, 1.3, 2, 30]),
+                      'kp': random.choice([0.5, 0.6, 1]),
+                      'ki': random.choice([0.0003, 0.001, 0.003]),
+                      'kd': random.choice([0, 0.5]),
+                      'kimax': random.choice([1, 1.2, 3]),
+                      'kidec': random.choice([0.02, 0.1, 0.3])}
+            configs += 1
+            max_diff, control, waterings = compare_run(params)
+            worst_diff = max(worst_diff, max_diff)
+            if max_diff > CONTROL_TOLERANCE:
+                failures.append(f"control differs by {max_diff:.6f} l: {params}")
+            if control is not None:
+                diverged += 1
+                if abs(control - params['liters_per_event']) > CONTROL_TOLERANCE:
+                    failures.append(f"decision differs at float control {control:.6f} after {waterings} waterings: {params}")
+            check_state_transfer(params, failures)
+
+    print(f"{configs} configs, {SIM_DAYS} days: max |control difference| {worst_diff:.6f} l, "
+          f"{diverged} configs with a decision right at the threshold")
+    for failure in failures:
+        print(f"FAILED: {failure}")
+    if failures:
+        raise SystemExit(f"{len(failures)} checks failed")
+    print(f"FixedPointWateringController within {CONTROL_TOLERANCE} l of WateringController")
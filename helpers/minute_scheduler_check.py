@@ -0,0 +1,128 @@
+# Checks the once-per-minute guarantee of the Logic trigger loop on a fake clock: the loop sleeps until the next
+# wall-clock minute like Logic.__waitForTrigger() does, but wakes up late, early (manual triggers), gets blocked
+# for minutes at a time and has its wall clock stepped by NTP corrections. Every minute must be evaluated exactly
+# once, and the watering events must be the ones of a controller stepped once per minute without any of that.
+# Run from root directory as:
+# python -m helpers.minute_scheduler_check
+
+import random
+
+from firmware.src.WateringController import WateringController
+from firmware.src.scheduler import MinuteScheduler
+
+SECONDS_PER_STEP = MinuteScheduler.SECONDS_IN_MINUTE
+SIM_DAYS = 10
+START = 1735689600 # 2025-01-01 00:00 UTC
+PARAMS = {'setpoint': 8, 'liters_per_event': 3.5, 'deadtime_sec': 10*60,
+          'watering_windows': [(9 * 3600, 9 * 3600 + 15 * 60), (19 * 3600, 21 * 3600)],
+          'time_window_days': 1, 'kp': 1, 'ki': 0.001, 'kd': 0, 'kimax': 1, 'kidec': 0.1}
+
+
+class RecordingController(WateringController):
+    # remembers the time of every evaluated iteration (also the ones skipped by advance()) and of every watering
+    def __init__(self, **params):
+        super().__init__(**params)
+        self.evaluated = []
+        self.watered = []
+
+    def run_single_iteration(self, current_time_seconds):
+        self.evaluated.append(current_time_seconds)
+        result = super().run_single_iteration(current_time_seconds)
+        if result[0]:
+            self.watered.append(current_time_seconds)
+        return result
+
+    def advance(self, current_time_seconds, steps, seconds_per_step=60):
+        self.evaluated.extend(current_time_seconds + k * seconds_per_step for k in range(steps))
+        return super().advance(current_time_seconds, steps, seconds_per_step)
+
+
+class FakeClock:
+    # true time in ms plus the wall clock offset, which NTP corrections step
+    def __init__(self, start_seconds):
+        self.true_ms = start_seconds * 1000
+        self.offset_ms = 0
+
+    def wall_seconds(self):
+        return (self.true_ms + self.offset_ms) // 1000
+
+    def sleep_ms(self, ms):
+        self.true_ms += ms
+
+
+def controller_trigger(scheduler: MinuteScheduler, controller: WateringController, wall_seconds):
+    # same as Logic.__controllerTrigger(), without the telemetry
+    minutes = scheduler.due(wall_seconds)
+    if minutes == 0:
+        return False
+    t = scheduler.lastMinuteStart()
+    missed_watering = False
+    if minutes > 1:
+        missed_watering = bool(controller.run_iterations(t - (minutes - 1) * SECONDS_PER_STEP, minutes - 1, SECONDS_PER_STEP))
+    should_water, _ = controller.run_single_iteration(t)
+    return should_water or missed_watering
+
+
+def simulate(seed, clock_steps_back):
+    rng = random.Random(seed)
+    clock = FakeClock(START)
+    scheduler = MinuteScheduler()
+    controller = RecordingController(**PARAMS)
+    waterings = 0
+    while clock.true_ms < (START + SIM_DAYS * WateringController.SECONDS_IN_DAY) * 1000:
+        if controller_trigger(scheduler, controller, clock.wall_seconds()):
+            waterings += 1
+            clock.sleep_ms(rng.randint(40, 60) * 1000) # the watering cycle blocks the trigger loop
+        timeout_ms = (SECONDS_PER_STEP - clock.wall_seconds() % SECONDS_PER_STEP) * 1000
+        event = rng.random()
+        if event < 0.05:
+            clock.sleep_ms(rng.randint(0, timeout_ms)) # manual trigger, wakes up early
+        elif event < 0.06:
+            clock.sleep_ms(rng.randint(1, 15) * 60000) # loop blocked over several minutes
+        else:
+            clock.sleep_ms(timeout_ms + rng.randint(0, 300)) # late wakeup
+        if rng.random() < 0.01:
+            # NTP correction of a few seconds
+            low = -3000 if clock_steps_back else 0
+            clock.offset_ms += rng.randint(low, 3000)
+    return controller, waterings
+
+
+def reference_events(first_minute, last_minute):
+    controller = WateringController(**PARAMS)
+    return controller.run_iterations(first_minute, (last_minute - first_minute) // SECONDS_PER_STEP + 1, SECONDS_PER_STEP)
+
+
+if __name__ == "__main__":
+    failures = 0
+    for seed in range(10):
+        controller, waterings = simulate(seed, clock_steps_back=False)
+        evaluated = controller.evaluated
+        expected = list(range(evaluated[0], evaluated[-1] + 1, SECONDS_PER_STEP))
+        if evaluated != expected:
+            failures += 1
+            print(f"seed {seed}: {len(evaluated)} evaluated minutes, expected every one of {len(expected)} exactly once")
+        reference = reference_events(evaluated[0], evaluated[-1])
+        if controller.watered != reference:
+            failures += 1
+            print(f"seed {seed}: watering events differ from stepping once per minute")
+        if waterings != len(reference):
+            failures += 1
+            print(f"seed {seed}: {waterings} waterings run, expected {len(reference)}")
+
+        # with the clock stepped back, the minutes after the step are evaluated again, but never skipped
+        controller, _ = simulate(seed, clock_steps_back=True)
+        evaluated = controller.evaluated
+        missing = set(range(evaluated[0], max(evaluated) + 1, SECONDS_PER_STEP)) - set(evaluated)
+        gaps = [b for a, b in zip(evaluated, evaluated[1:]) if b - a > SECONDS_PER_STEP]
+        if missing or gaps:
+            failures += 1
+            print(f"seed {seed}, clock stepped back: {len(missing)} minutes never evaluated, {len(gaps)} gaps")
+        events = controller.watered
+        if any(b - a < PARAMS['deadtime_sec'] for a, b in zip(events, events[1:])):
+            failures += 1
+            print(f"seed {seed}, clock stepped back: watered twice within the deadtime")
+    print(f"10 seeds, {SIM_DAYS} days each")
+    if failures:
+        raise SystemExit(f"{failures} failures")
+    print("every minute evaluated exactly once")
@@ -0,0 +1,178 @@
+# Parameter sweep over WateringController configs, spread over all CPU cores, with on-disk result cache.
+# Run from root directory, e.g.:
+# python -m helpers.parameter_sweep --grid setpoint=1:15 kp=0.5,1 ki=0.001,0.003
+# python -m helpers.parameter_sweep --params my_params.json --days 30
+#
+# Each result is cached under helpers/outputs/sweep_cache, keyed by the params, the simulation horizon
+# and the WateringController source, so a re-run only simulates configs that changed.
+
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from firmware.src import WateringController as controller_module
+from firmware.src import WateringSchedule as schedule_module
+from firmware.src.WateringController import WateringController
+
+LITERS_PER_WATERING = 4.0
+WATERING_WINDOWS = [(9 * 3600, 9 * 3600 + 15 * 60), (19 * 3600, 21 * 3600)]
+START_TIMESTAMP = 1735689600 # 2025-01-01 00:00 UTC, fixed so cached results stay valid between runs
+SIM_DAYS = 50
+SECONDS_PER_STEP = 60
+STEADY_STATE_OFFSET_DAYS = 5
+
+DEFAULT_PARAMS = {
+    'setpoint': 14,
+    'deadtime_sec': 10*60,
+    'time_window_days': 1,
+    'kp': 1,
+    'ki': 0.001,
+    'kd': 0,
+    'kimax': 1,
+    'kidec': 0.1
+}
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE_DIR = f"{CURRENT_DIR}/outputs/sweep_cache"
+
+
+def controller_source_hash():
+    # every module the simulated controller runs, a change in any of them invalidates the cache
+    digest = hashlib.sha256()
+    for module in (controller_module, schedule_module):
+        with open(module.__file__, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def cache_key(params, horizon, source_hash):
+    payload = json.dumps({'params': params, 'horizon': horizon, 'source': source_hash}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def simulate_config(params, horizon):
+    controller = WateringController(**params,
+                                    liters_per_event=horizon['liters_per_event'],
+                                    watering_windows=horizon['watering_windows'])
+    events = []
+    end_time = horizon['start'] + horizon['days'] * WateringController.SECONDS_IN_DAY
+    t = horizon['start']
+    while t <= end_time:
+        should_water, _ = controller.run_single_iteration(t)
+        if should_water:
+            events.append(t)
+        t += horizon['seconds_per_step']
+
+    steady_state_timestamp = horizon['start'] + STEADY_STATE_OFFSET_DAYS * WateringController.SECONDS_IN_DAY
+    steady_state_events = sum(1 for t in events if t > steady_state_timestamp)
+    steady_state_days = horizon['days'] - STEADY_STATE_OFFSET_DAYS
+    return {'params': params,
+            'events': events,
+            'steady_state_events': steady_state_events,
+            'steady_state_average': steady_state_events * horizon['liters_per_event'] / steady_state_days if steady_state_days > 0 else None}
+
+
+def _run_job(job):
+    # executed in worker processes; writes through a temp file so an interrupted sweep never leaves a partial entry
+    params, horizon, path = job
+    result = simulate_config(params, horizon)
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, 'w') as f:
+        json.dump(result, f)
+    os.replace(tmp_path, path)
+    return result
+
+
+def run_sweep(params_list, horizon, cache_dir=DEFAULT_CACHE_DIR, workers=None):
+    """
+    Returns results in params_list order; cached entries are read from disk, the rest are simulated in a process pool.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    source_hash = controller_source_hash()
+    results = [None] * len(params_list)
+    pending = []
+    for index, params in enumerate(params_list):
+        path = f"{cache_dir}/{cache_key(params, horizon, source_hash)}.json"
+        try:
+            with open(path, 'r') as f:
+                results[index] = json.load(f)
+        except (OSError, ValueError):
+            pending.append((index, (params, horizon, path)))
+
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for (index, _), result in zip(pending, pool.map(_run_job, [job for _, job in pending], chunksize=4)):
+                results[index] = result
+    return results, len(pending)
+
+
+def _parse_values(text):
+    # "1:15" -> range(1, 15), "0.5,1" -> [0.5, 1], "3" -> [3]
+    def number(v):
+        return float(v) if any(c in v for c in '.e') else int(v)
+
+    if ':' in text:
+        return list(range(*(int(v) for v in text.split(':'))))
+    return [number(v) for v in text.split(',')]
+
+
+def expand_grid(grid_args, base_params=DEFAULT_PARAMS):
+    grid = {}
+    for arg in grid_args:
+        key, _, values = arg.partition('=')
+        if key not in base_params:
+            raise ValueError(f"Unknown parameter: {key}")
+        grid[key] = _parse_values(values)
+
+    params_list = []
+    for combination in itertools.product(*grid.values()):
+        params = dict(base_params)
+        params.update(zip(grid.keys(), combination))
+        params_list.append(params)
+    return params_list
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run WateringController parameter sweep")
+    configs = parser.add_mutually_exclusive_group()
+    configs.add_argument('--grid', nargs='*', default=[], help="key=v1,v2 or key=start:stop, combined as cartesian product over defaults")
+    configs.add_argument('--params', help="JSON file with a list of (partial) param dicts, merged over defaults")
+    parser.add_argument('--days', type=int, default=SIM_DAYS)
+    parser.add_argument('--step', type=int, default=SECONDS_PER_STEP, help="seconds per simulation step")
+    parser.add_argument('--workers', type=int, default=None, help="process count, all CPU cores by default")
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR)
+    parser.add_argument('--output', default=f"{CURRENT_DIR}/outputs/sweep_results.csv")
+    args = parser.parse_args()
+
+    if args.params:
+        with open(args.params, 'r') as f:
+            params_list = [dict(DEFAULT_PARAMS, **p) for p in json.load(f)]
+    else:
+        params_list = expand_grid(args.grid)
+
+    horizon = {'start': START_TIMESTAMP,
+               'days': args.days,
+               'seconds_per_step': args.step,
+               'liters_per_event': LITERS_PER_WATERING,
+               'watering_windows': WATERING_WINDOWS}
+
+    t0 = time.perf_counter()
+    results, simulated = run_sweep(params_list, horizon, args.cache_dir, args.workers)
+    print(f"{len(results)} configs ({simulated} simulated, {len(results) - simulated} cached) in {time.perf_counter() - t0:.1f}s")
+
+    keys = list(DEFAULT_PARAMS.keys())
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        f.write(','.join(keys + ['events', 'steady_state_events', 'steady_state_average']) + '\n')
+        for result in results:
+            row = [result['params'][k] for k in keys] + [len(result['events']), result['steady_state_events'], result['steady_state_average']]
+            f.write(','.join(str(v) for v in row) + '\n')
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
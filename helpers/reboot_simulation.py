@@ -0,0 +1,108 @@
+# Simulates reboots at random times and compares the watering with no reboots, cold reboots (PID state lost,
+# only the event log survives) and warm reboots (PID state restored from ControllerStateStore).
+# Runs the firmware stores on files in a temporary directory, so the throttled checkpoint writes are the real ones.
+# Run from root directory as:
+# python -m helpers.reboot_simulation
+
+import os, random, tempfile
+
+from firmware.src.WateringController import WateringController
+from firmware.src.EventLogStore import EventLogStore
+from firmware.src.ControllerStateStore import ControllerStateStore
+
+LITERS_PER_WATERING = 3.5
+WATERING_WINDOWS = [(9 * 3600, 9 * 3600 + 15 * 60), (19 * 3600, 21 * 3600)]
+SECONDS_PER_STEP = 60
+SIM_DAYS = 40
+WARMUP_DAYS = 5 # excluded from the averages
+REBOOT_MEAN_HOURS = 12
+REBOOT_DOWNTIME_SEC = (30, 300)
+STATE_INTEGRAL_TOLERANCE = 0.05 # same as Logic
+START = 1735689600 # 2025-01-01 00:00 UTC
+PARAMS_LIST = [{'setpoint': 4, 'deadtime_sec': 10*60, 'time_window_days': 1, 'kp': 1, 'ki': 0.001, 'kd': 0, 'kimax': 1, 'kidec': 0.1},
+               {'setpoint': 8, 'deadtime_sec': 30*60, 'time_window_days': 1.2, 'kp': 0.6, 'ki': 0.003, 'kd': 0.5, 'kimax': 1.2, 'kidec': 0.3},
+               {'setpoint': 12, 'deadtime_sec': 60*60, 'time_window_days': 2, 'kp': 0.5, 'ki': 0.001, 'kd': 0, 'kimax': 1, 'kidec': 0.02}]
+
+
+class QuietConsole:
+    def write(self, buf):
+        pass
+
+
+def reboot_times(seed):
+    rng = random.Random(seed)
+    times = []
+    t = START
+    while True:
+        t += int(rng.expovariate(1 / (REBOOT_MEAN_HOURS * 3600)))
+        if t >= START + SIM_DAYS * WateringController.SECONDS_IN_DAY:
+            return times
+        times.append((t, rng.randint(*REBOOT_DOWNTIME_SEC)))
+
+
+def simulate(params, reboots, mode, directory):
+    """
+    mode: 'none' (reboots ignored), 'cold' or 'warm'. Returns watering event timestamps and number of state writes.
+    """
+    console = QuietConsole()
+    event_path = os.path.join(directory, f"{mode}_eventLog.bin")
+    state_path = os.path.join(directory, f"{mode}_controllerState.bin")
+
+    def boot():
+        event_store = EventLogStore(event_path, console)
+        controller = WateringController(**params, liters_per_event=LITERS_PER_WATERING, watering_windows=WATERING_WINDOWS,
+                                        load_event_log_callback=event_store.load, store_event_log_callback=event_store.store)
+        state_store = ControllerStateStore(state_path, console)
+        if mode == 'warm':
+            snapshot = state_store.load()
+            if snapshot:
+                controller.set_state(*snapshot[1])
+        return controller, state_store
+
+    controller, state_store = boot()
+    events, writes = [], 0
+    pending = list(reboots) if mode != 'none' else []
+    end = START + SIM_DAYS * WateringController.SECONDS_IN_DAY
+    t = START
+    while t < end:
+        if pending and t >= pending[0][0]:
+            _, downtime = pending.pop(0)
+            writes += state_store.writes
+            t += downtime - downtime % SECONDS_PER_STEP
+            controller, state_store = boot()
+            continue
+        should_water, _ = controller.run_single_iteration(t)
+        if should_water:
+            events.append(t)
+        if mode == 'warm':
+            state_store.store(t, controller.get_state(), STATE_INTEGRAL_TOLERANCE * controller.integral_max)
+        t += SECONDS_PER_STEP
+    return events, writes + state_store.writes
+
+
+def summarize(params, events, writes):
+    steady_start = START + WARMUP_DAYS * WateringController.SECONDS_IN_DAY
+    steady_days = SIM_DAYS - WARMUP_DAYS
+    steady = [t for t in events if t >= steady_start]
+    liters_per_day = len(steady) * LITERS_PER_WATERING / steady_days
+    # daily totals, to show how uneven the watering gets
+    daily = [0.0] * steady_days
+    for t in steady:
+        daily[(t - steady_start) // WateringController.SECONDS_IN_DAY] += LITERS_PER_WATERING
+    mean = sum(daily) / steady_days
+    spread = (sum((x - mean) ** 2 for x in daily) / steady_days) ** 0.5
+    deadtime_violations = sum(1 for a, b in zip(events, events[1:]) if b - a < params['deadtime_sec'])
+    return {'liters_per_day': liters_per_day, 'error': liters_per_day - params['setpoint'], 'daily_spread': spread,
+            'deadtime_violations': deadtime_violations, 'state_writes_per_day': writes / SIM_DAYS}
+
+
+if __name__ == "__main__":
+    for index, params in enumerate(PARAMS_LIST):
+        reboots = reboot_times(seed=index)
+        print(f"setpoint {params['setpoint']} l/day, {len(reboots)} reboots in {SIM_DAYS} days")
+        for mode in ('none', 'cold', 'warm'):
+            with tempfile.TemporaryDirectory() as directory: # every run starts with empty storage
+                events, writes = simulate(params, reboots, mode, directory)
+            s = summarize(params, events, writes)
+            print(f"  {mode:>4}: {s['liters_per_day']:6.2f} l/day (error {s['error']:+.2f}), daily spread {s['daily_spread']:.2f} l, "
+                  f"deadtime violations {s['deadtime_violations']}, state writes {s['state_writes_per_day']:.1f}/day")
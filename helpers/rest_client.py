@@ -1,5 +1,6 @@
-import requests, json
+import requests, json, time
 from datetime import datetime
+from firmware.src.config import WifiConfig, HwConfig, ControlConfig
 
 DEVICE_IP = "192.168.0.157"
 
@@ -15,6 +16,37 @@ def time_set(time_values : dict | None = None):
 def time_get():
     print(send('time', 'get'))
 
+def telemetry_get(start: int | None = None, end: int | None = None, points: int = 200):
+    params = {'points': points}
+    if start is not None:
+        params['start'] = start
+    if end is not None:
+        params['end'] = end
+    response = requests.get(f"http://{DEVICE_IP}/telemetry", params=params)
+    return response.status_code, response.json()
+
+def wifi_scan_get(refresh: bool = False):
+    response = requests.get(f"http://{DEVICE_IP}/wifi/scan", params={'refresh': '1'} if refresh else {})
+    return response.status_code, response.json()
+
+CONFIG_SCHEMAS = {'wifiConfig': WifiConfig.SCHEMA, 'hwConfig': HwConfig.SCHEMA, 'controlConfig': ControlConfig.SCHEMA}
+
+def config_set(name: str, values: dict):
+    # validated with the firmware schema before sending, the device checks it again anyway
+    errors = CONFIG_SCHEMAS[name].validate(values)
+    if errors:
+        return 400, {'error': 'Invalid values', 'fields': errors}
+    return send(name, 'post', values)
+
+def job_wait(job_id: int, timeout_s: float = 15.0):
+    # polls a background job (config writes, NTP sync) until it finishes
+    deadline = time.monotonic() + timeout_s
+    while True:
+        _, job = send(f'jobs/{job_id}', 'get')
+        if job.get('state') not in ('queued', 'running') or time.monotonic() > deadline:
+            return job
+        time.sleep(0.2)
+
 def get_current_time():
     now = datetime.now()
     return {'year': now.year,
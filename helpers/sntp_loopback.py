@@ -0,0 +1,137 @@
+"""
+Runs the firmware SntpClient on the host against local UDP stand-in servers: a fast one, a slow one
+(asymmetric delay), a silent one (timeout) and one answering with an unsynchronized header. The RTC is
+emulated with a configurable offset and drift, so the offset correction, the server choice and the drift
+estimate can be checked without a device.
+
+Usage: python -m helpers.sntp_loopback
+"""
+import asyncio
+import math
+import socket
+import struct
+import threading
+import time
+
+from firmware.src import sntp
+from firmware.src.sntp import SntpClient, NTP_EPOCH_OFFSET
+
+
+class HostClock:
+    # ticks_ms interface of firmware/src/scheduler.py on top of the host monotonic clock
+    def ticks_ms(self):
+        return int(time.monotonic() * 1000)
+
+    def ticks_add(self, ticks, delta):
+        return ticks + delta
+
+    def ticks_diff(self, ticks1, ticks2):
+        return ticks1 - ticks2
+
+    async def sleep_ms(self, ms):
+        await asyncio.sleep(ms / 1000)
+
+
+class DriftingRtc:
+    # seconds resolution RTC running (1 + driftPpm / 1e6) times as fast as the host clock
+    def __init__(self, offsetSec, driftPpm):
+        self.rate = 1 + driftPpm / 1e6
+        self.base = time.time() + offsetSec
+        self.baseMonotonic = time.monotonic()
+
+    def exact(self):
+        return self.base + (time.monotonic() - self.baseMonotonic) * self.rate
+
+    def get(self):
+        return int(math.floor(self.exact()))
+
+    def set(self, seconds):
+        self.base = seconds
+        self.baseMonotonic = time.monotonic()
+
+
+def ntp_timestamp(t):
+    seconds = int(t)
+    return struct.pack('!II', seconds + NTP_EPOCH_OFFSET, int((t - seconds) * (1 << 32)))
+
+
+def run_server(sock, uplink_delay_s=0.0, silent=False, leap=0):
+    while True:
+        try:
+            request, address = sock.recvfrom(48)
+        except OSError:
+            return
+        if silent:
+            continue
+        time.sleep(uplink_delay_s) # request "still travelling", so the server receives it later
+        receive = time.time()
+        response = bytearray(48)
+        response[0] = (leap << 6) | (3 << 3) | 4
+        response[1] = 2 # stratum
+        response[24:32] = request[40:48]
+        response[32:40] = ntp_timestamp(receive)
+        response[40:48] = ntp_timestamp(time.time())
+        sock.sendto(response, address)
+
+
+def start_servers():
+    servers = {}
+    for name, kwargs in (('fast', {}), ('slow', {'uplink_delay_s': 0.08}), ('silent', {'silent': True}),
+                         ('unsynced', {'leap': 3})):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(('127.0.0.1', 0))
+        threading.Thread(target=run_server, args=(sock,), kwargs=kwargs, daemon=True).start()
+        servers[name] = sock
+    return servers
+
+
+# every sync leaves an error of a ms or two (the RTC phase is polled), the interval has to be long enough
+# for that to stay within the drift tolerance
+DRIFT_INTERVAL_SEC = 45
+DRIFT_TOLERANCE_PPM = 100
+
+
+async def verify():
+    servers = start_servers()
+    ports = {name: sock.getsockname()[1] for name, sock in servers.items()}
+    original_getaddrinfo = socket.getaddrinfo
+
+    def getaddrinfo(host, port, *args):
+        # server names map to the stand-in ports
+        if host in ports:
+            return original_getaddrinfo('127.0.0.1', ports[host], *args)
+        return original_getaddrinfo(host, port, *args)
+    sntp.socket.getaddrinfo = getaddrinfo
+
+    failures = 0
+    rtc = DriftingRtc(offsetSec=-3.3, driftPpm=4000)
+    SntpClient.MIN_DRIFT_INTERVAL_MS = 2000 # the emulated drift is large enough to measure within seconds
+    client = SntpClient(['silent', 'unsynced', 'slow', 'fast'], rtc.get, rtc.set, clock=HostClock(), timeoutMs=300,
+                        minIntervalSec=60, maxIntervalSec=3600, maxErrorMs=100)
+
+    for attempt in range(3):
+        ok = await client.sync()
+        error_ms = (rtc.exact() - time.time()) * 1000
+        print(f"sync {attempt}: ok={ok} {client.toDict()} rtc error after sync {error_ms:+.1f} ms")
+        if not ok or client.lastServer != 'fast' or abs(error_ms) > 20:
+            failures += 1
+        await asyncio.sleep(DRIFT_INTERVAL_SEC)
+
+    measured = client.driftPpm
+    print(f"drift: emulated 4000 ppm, measured {measured:.0f} ppm, next sync in {client.nextSyncDelaySec()} s")
+    if measured is None or abs(measured - 4000) > DRIFT_TOLERANCE_PPM:
+        failures += 1
+
+    lonely = SntpClient(['silent'], rtc.get, rtc.set, clock=HostClock(), timeoutMs=200)
+    ok = await lonely.sync()
+    print(f"silent server only: ok={ok}, retry in {lonely.nextSyncDelaySec()} s")
+    if ok or lonely.nextSyncDelaySec() != lonely.retryIntervalSec:
+        failures += 1
+
+    for sock in servers.values():
+        sock.close()
+    print("OK" if not failures else f"{failures} checks failed")
+
+
+if __name__ == "__main__":
+    asyncio.run(verify())
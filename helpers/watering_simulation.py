@@ -5,31 +5,9 @@ import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 from datetime import datetime, timedelta, timezone
 import os
+import numpy as np
 
-from firmware.src.WateringController import WateringController
-
-def simulate(controller: WateringController, start_time, end_time, seconds_per_step):
-    times, avg_flow = [], []
-    p_terms, i_terms, d_terms, control_signals = [], [], [], []
-    eventsX, eventsY = [], []
-    t = start_time
-    while t <= end_time:
-        should_water, (current_average, control, (p,i,d)) = controller.run_single_iteration(int(t.timestamp()))
-        
-        times.append(t)
-        avg_flow.append(current_average)
-        control_signals.append(control)
-        p_terms.append(p)
-        i_terms.append(i)
-        d_terms.append(d)
-        
-        if should_water:
-            eventsX.append(t)
-            eventsY.append(current_average)
-
-        t += timedelta(seconds=seconds_per_step)
-
-    return times, avg_flow, eventsX, eventsY, p_terms, i_terms, d_terms, control_signals
+from helpers.batch_simulation import make_time_axis, simulate_batch
 
 # Simulation constants
 LITERS_PER_WATERING = 4.0
@@ -62,24 +40,31 @@ for liters in range(1,15):
     params_list.append(params)
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
-for p in params_list:
+start_time = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+end_time = start_time + timedelta(days=SIM_DAYS)
+
+# all configs are stepped together, see helpers/batch_simulation.py
+timestamps = make_time_axis(start_time.timestamp(), end_time.timestamp(), SECONDS_PER_STEP)
+columns = {key: [p[key] for p in params_list] for key in params_list[0]}
+batch_water, batch_avg, batch_control, batch_p, batch_i, batch_d = simulate_batch(timestamps, WATERING_WINDOWS, LITERS_PER_WATERING, **columns)
+times = [datetime.fromtimestamp(int(t), timezone.utc) for t in timestamps]
+
+for c, p in enumerate(params_list):
     filename = f"{current_dir}/outputs/sim_p={p['kp']}_i={p['ki']}_d={p['kd']}_im={p['kimax']}_id={p['kidec']}_setp={p['setpoint']}_dead={p['deadtime_sec']}.png"
-    print(f"Simulating: {filename}")
+    print(f"Plotting: {filename}")
 
-    controller = WateringController(**p,
-                                    liters_per_event=LITERS_PER_WATERING,
-                                    watering_windows=WATERING_WINDOWS)
-    
-    start_time = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
-    end_time = start_time + timedelta(days=SIM_DAYS)
-    times, avg_flow, eventsX, eventsY, p_terms, i_terms, d_terms, control_signals = simulate(controller, start_time, end_time, seconds_per_step=SECONDS_PER_STEP)
+    avg_flow, control_signals = batch_avg[:, c], batch_control[:, c]
+    p_terms, i_terms, d_terms = batch_p[:, c], batch_i[:, c], batch_d[:, c]
+    event_indexes = np.flatnonzero(batch_water[:, c])
+    eventsX = [times[n] for n in event_indexes]
+    eventsY = avg_flow[event_indexes]
 
     # --- Plotting ---
     fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(14, 10), sharex=True)
 
     steady_state_timestamp = times[0] + timedelta(days=STEADY_STATE_OFFSET_DAYS)
     steady_state_events = sum([1 for t in eventsX if t > steady_state_timestamp])
-    actual_average = steady_state_events * controller.liters_per_event / (SIM_DAYS - STEADY_STATE_OFFSET_DAYS)
+    actual_average = steady_state_events * LITERS_PER_WATERING / (SIM_DAYS - STEADY_STATE_OFFSET_DAYS)
 
     ax1.set_title(f"events in steady state: {steady_state_events}")
     ax1.set_ylabel("Average Liters/Day", color='tab:blue')